@@ -0,0 +1,124 @@
+#: Description: Batch replay and validation of Janggi games. Each game is a list of (from, to) positions played from the
+#               standard setup. Games are grouped into chunks and spread over a pool of worker processes, with only a
+#               bounded number of chunks in flight, and results are yielded in input order as they arrive.
+#               Run from the command line, for example: python JanggiBatch.py games.jgr --workers 8
+
+import argparse
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from JanggiGame import JanggiGame
+from JanggiRecord import read_games
+
+# game_state is the final get_game_state value, illegal_move the index of the first rejected move or None, and
+# checks a list of (move index, color) for every move that left a player in check
+ValidationResult = namedtuple('ValidationResult', ['game_state', 'moves_played', 'illegal_move', 'checks'])
+
+
+def validate_game(moves):
+    """
+    Takes a list of (from, to) positions and returns a ValidationResult from replaying them on a new game. Replay
+    stops at the first move make_move rejects.
+    """
+    game = JanggiGame()
+    checks = []
+    illegal_move = None
+
+    for index, (current_position, new_position) in enumerate(moves):
+        if game.make_move(current_position, new_position) is False:
+            illegal_move = index
+            break
+        for color in ('red', 'blue'):
+            if game.is_in_check(color):
+                checks.append((index, color))
+
+    played = len(moves) if illegal_move is None else illegal_move
+    return ValidationResult(game.get_game_state(), played, illegal_move, checks)
+
+
+def _validate_chunk(chunk):
+    """
+    Takes a list of move lists and returns the list of their ValidationResults. Runs in a worker process.
+    """
+    return [validate_game(moves) for moves in chunk]
+
+
+def validate_games(move_lists, workers=None, chunk_size=64):
+    """
+    Takes an iterable of move lists, a number of worker processes, defaulting to one per CPU, and the number of games
+    sent to a worker at a time, and yields a ValidationResult for each game in input order. At most two chunks per
+    worker are read ahead, so the iterable may be far larger than memory. With one worker, games are replayed in
+    this process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    move_lists = iter(move_lists)
+
+    if workers <= 1:
+        for moves in move_lists:
+            yield validate_game(moves)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(move_lists, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_validate_chunk, chunk))
+
+            if not pending:
+                return
+
+            for result in pending.popleft().result():
+                yield result
+
+
+def main(argv=None):
+    """
+    Command line entry point. Replays every game in a record file and prints the games whose replay is illegal or
+    does not reach the stored result, followed by totals and games per second.
+    """
+    parser = argparse.ArgumentParser(description="Validate the games in a Janggi game record file.")
+    parser.add_argument("path", help="game record file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument("--chunk-size", type=int, default=64, help="games sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    # stored results of games read but not yet checked, oldest first
+    stored_results = deque()
+
+    def moves_of_games():
+        for moves, result in read_games(args.path):
+            stored_results.append(result)
+            yield moves
+
+    start = time.perf_counter()
+    games = 0
+    failures = 0
+
+    for number, result in enumerate(validate_games(moves_of_games(), args.workers, args.chunk_size)):
+        games += 1
+        stored = stored_results.popleft()
+        if result.illegal_move is not None:
+            failures += 1
+            print("game %d: illegal move at index %d" % (number, result.illegal_move))
+        elif result.game_state != stored:
+            failures += 1
+            print("game %d: stored %s, replay gives %s" % (number, stored, result.game_state))
+
+    seconds = time.perf_counter() - start
+    print("games: %d failures: %d seconds: %.3f games/sec: %.0f" % (
+        games, failures, seconds, games / seconds if seconds else 0))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
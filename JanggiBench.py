@@ -0,0 +1,259 @@
+#: Description: Microbenchmarks for the Janggi rules engine. Times each building block (possible_moves and
+#               is_valid_move per piece type, the get_objects_in_* scanners, make_move on quiet and checking moves
+#               with and without the validation cache, and checkmate tests) over a fixed corpus of positions, and
+#               prints the results as JSON. Results can be saved and compared against a later run to catch
+#               performance regressions.
+#               Run from the command line, for example: python JanggiBench.py --output before.json
+#                                                       python JanggiBench.py --compare before.json
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from JanggiGame import COLUMNS, SQUARE_NAMES, JanggiGame, ValidationCache
+
+# fixed positions as to_fen text: quiet middlegames, positions in check and checkmates. Kept as text rather than
+# generated so the corpus stays the same from one commit to the next.
+CORPUS = [
+    '4k1C2/4na3/7cn/2p1pr2p/5p3/8P/P5P2/C3K3N/4N3R/1R2AAB2 r 3 28',
+    '1b1a1ab1r/1n1kn4/7c1/p3p1p1p/1p7/1c7/2P2PP1P/1C2K2C1/1R2N4/1B2AABN1 r 0 12',
+    '1bn1aab2/r3k3r/1c5cn/p3p1p1p/2p6/9/P1P1PP2P/5KCCN/3A5/RBN2ABR1 r 13 7',
+    '1bn2abn1/3ak3r/1c7/2p2p1r1/3c1p2p/9/2P2P3/1C1B1K3/5A3/2NA3N1 b 1 19',
+    '1b2aab2/3k2r2/rn4nc1/1B1pp1p1p/p8/2P2P3/P6PP/3K1A1C1/1R7/2N2ABNR b 2 19',
+    '1bR3b2/4a4/1c3k1cR/3p5/5P3/2P2P3/2P6/5N2C/3K5/1B1AA1B2 r 5 43',
+    '3a2b2/4k3c/1n6n/1ppb1p1p1/4p4/P1N3r1P/3P5/2R1A4/5K3/1B2A4 r 2 40',
+    'r3aC3/4rnc2/4k4/4p2pp/n3P4/9/PP4P1P/3CK4/9/1B2AABNc r 0 24',
+    '1C1a1ab1r/3k5/1n5cn/1pp3p1p/9/9/6P1P/3CK3N/N8/3AA3R r 2 18',
+    'r1n2ab2/1C2a4/1c2k1n2/5p3/9/1P3P3/8p/7rN/3K1R3/1BN1A1B2 r 0 33',
+    'r1na1abn1/9/1c2k2cr/p1p1p2pp/9/9/Pb1P1P2P/1C5C1/3AK3R/RBN2ABN1 r 0 10',
+    '1C4bnr/3a1a3/3nk2c1/4p3p/1p3B3/p4P2R/1NP4P1/1R5C1/4KN3/3r5 r 0 30',
+    'r5b2/n3k4/3a5/3p1C2p/4PBP2/7P1/1N2c4/4K4/9/4r4 r 1 41',
+    '1b2a1bn1/1n1k5/1c1a5/4c4/4pp1p1/1P4P2/PC2B4/1C7/R2rK4/1BN2A3 r 0 24',
+    '2Rk1abn1/9/1c1P5/p1p4p1/9/8p/P2P1P3/RC4N2/3K5/1B1A1AB2 b 0 25',
+    '2n2ab2/1R1a4r/4k2R1/1B7/4p2p1/9/1P2PP3/3K3C1/1N7/4AABN1 b 0 26',
+]
+
+# diagonals scanned by get_objects_in_diagonal: the fortress lines and the longest board diagonals
+DIAGONALS = [('d1', 'f3'), ('f1', 'd3'), ('d8', 'f10'), ('f8', 'd10'), ('a1', 'i9'), ('i1', 'a9'), ('a2', 'i10'),
+             ('i2', 'a10')]
+
+PIECE_NAMES = ('General', 'Guard', 'Elephant', 'Horse', 'Cannon', 'Chariot', 'Soldier')
+
+
+def load_corpus():
+    """
+    Returns a list of games, one per corpus position, with the validation cache turned off so that every make_move
+    does its full work.
+    """
+    games = [JanggiGame.from_fen(fen) for fen in CORPUS]
+    for game in games:
+        game.set_validation_cache(False)
+    return games
+
+
+def _pieces(games, name):
+    """
+    Takes games and a piece name and returns a list of (game, piece) for every piece of that name on the boards.
+    """
+    return [(game, a_piece) for game in games for a_piece in game._red_pieces + game._blue_pieces
+            if a_piece.get_name() == name and a_piece.get_square() is not None]
+
+
+def _split_moves(games):
+    """
+    Takes games and returns two lists of (game, from, to): quiet moves, which neither capture nor give check, and
+    moves that give check, both in sorted order.
+    """
+    quiet, checking = [], []
+
+    for game in games:
+        if game.get_game_state() != 'UNFINISHED':
+            continue
+        for current_position, new_position in sorted(game.legal_moves()):
+            if current_position == new_position:
+                continue
+            capture = game.get_piece_from_position(new_position) is not None
+            game.make_move(current_position, new_position)
+            gives_check = game.get_is_in_check() in ('red', 'blue')
+            game.pop()
+            if gives_check:
+                checking.append((game, current_position, new_position))
+            elif not capture:
+                quiet.append((game, current_position, new_position))
+
+    return quiet, checking
+
+
+def build_benchmarks(games):
+    """
+    Takes the corpus games and returns a dict of benchmark name to a function that runs one pass and returns the
+    number of operations it made.
+    """
+    benchmarks = {}
+
+    for name in PIECE_NAMES:
+        pieces = _pieces(games, name)
+        moves = [(game, a_piece.get_position(), [SQUARE_NAMES[square] for square in a_piece.possible_moves()])
+                 for game, a_piece in pieces]
+
+        def possible_moves(pieces=pieces):
+            for game, a_piece in pieces:
+                a_piece.possible_moves()
+            return len(pieces)
+
+        def is_valid_move(moves=moves):
+            count = 0
+            for game, current_position, destinations in moves:
+                for new_position in destinations:
+                    game.is_valid_move(current_position, new_position)
+                count += len(destinations)
+            return count
+
+        benchmarks['possible_moves:' + name] = possible_moves
+        benchmarks['is_valid_move:' + name] = is_valid_move
+
+    def get_objects_in_row():
+        for game in games:
+            for row in range(1, 11):
+                game.get_objects_in_row('a' + str(row), 'i' + str(row))
+        return len(games) * 10
+
+    def get_objects_in_column():
+        for game in games:
+            for column in COLUMNS:
+                game.get_objects_in_column(column + '1', column + '10')
+        return len(games) * 9
+
+    def get_objects_in_diagonal():
+        for game in games:
+            for start_position, end_position in DIAGONALS:
+                game.get_objects_in_diagonal(start_position, end_position)
+        return len(games) * len(DIAGONALS)
+
+    benchmarks['get_objects_in_row'] = get_objects_in_row
+    benchmarks['get_objects_in_column'] = get_objects_in_column
+    benchmarks['get_objects_in_diagonal'] = get_objects_in_diagonal
+
+    quiet, checking = _split_moves(games)
+
+    for name, moves in (('make_move:quiet', quiet), ('make_move:check', checking)):
+        def make_move(moves=moves):
+            for game, current_position, new_position in moves:
+                game.make_move(current_position, new_position)
+                game.pop()
+            return len(moves)
+
+        benchmarks[name] = make_move
+
+    # the same quiet moves read back from a cache of their own, which every pass after the first hits
+    cache = ValidationCache()
+
+    def make_move_cached():
+        for game, current_position, new_position in quiet:
+            game.set_validation_cache(True, cache)
+            game.make_move(current_position, new_position)
+            game.pop()
+            game.set_validation_cache(False)
+        return len(quiet)
+
+    benchmarks['make_move:cached'] = make_move_cached
+
+    in_check = [(game, game.get_is_in_check()) for game in games if game.get_is_in_check() in ('red', 'blue')]
+
+    def is_checkmate():
+        for game, color in in_check:
+            game.is_checkmate(color)
+        return len(in_check)
+
+    benchmarks['is_checkmate'] = is_checkmate
+    return benchmarks
+
+
+def run(names=None, repeat=5, min_seconds=0.05):
+    """
+    Takes optional benchmark names to run, the number of timed rounds and the least time a round should take, and
+    returns a dict of benchmark name to {'ops', 'ns_per_op'}, taking the fastest round. A round repeats the pass
+    until it has run for at least min_seconds.
+    """
+    benchmarks = build_benchmarks(load_corpus())
+    results = {}
+
+    for name, benchmark in benchmarks.items():
+        if names and name not in names:
+            continue
+
+        # warms up and finds how many passes fill a round
+        ops = benchmark()
+        start = time.perf_counter()
+        benchmark()
+        passes = max(1, int(min_seconds / max(time.perf_counter() - start, 1e-9)))
+
+        best = None
+        for num in range(repeat):
+            start = time.perf_counter_ns()
+            for pass_number in range(passes):
+                benchmark()
+            elapsed = time.perf_counter_ns() - start
+            if best is None or elapsed < best:
+                best = elapsed
+
+        results[name] = {'ops': ops, 'ns_per_op': best / (passes * ops) if ops else 0.0}
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Takes results, baseline results in the same form and the slowdown ratio allowed, and returns a list of
+    (name, baseline ns, new ns) for every benchmark that got slower than allowed.
+    """
+    regressions = []
+
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or not before['ns_per_op']:
+            continue
+        if result['ns_per_op'] > before['ns_per_op'] * threshold:
+            regressions.append((name, before['ns_per_op'], result['ns_per_op']))
+
+    return regressions
+
+
+def main(argv=None):
+    """
+    Command line entry point. Runs the benchmarks and prints the results as JSON, optionally saving them or
+    comparing them against a saved run, in which case it exits with 1 if any benchmark regressed.
+    """
+    parser = argparse.ArgumentParser(description="Time the Janggi rules engine's building blocks.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, all by default")
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds per benchmark, fastest is kept")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="least time a round should take")
+    parser.add_argument("--output", default=None, help="file to save the JSON results to")
+    parser.add_argument("--compare", default=None, help="saved JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    report = {'python': platform.python_version(), 'corpus_positions': len(CORPUS),
+              'results': run(args.names, args.repeat, args.min_seconds)}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(report['results'], baseline, args.threshold)
+        for name, before, after in regressions:
+            print("%s: %.0f ns -> %.0f ns" % (name, before, after), file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
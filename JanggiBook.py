@@ -0,0 +1,160 @@
+#: Description: Opening book for the Janggi rules engine. A book file is a magic number followed by fixed-size entries
+#               of (position hash, from square, to square, weight) sorted by hash. The file is memory-mapped and
+#               binary searched, so any number of processes can share one copy through the operating system's page
+#               cache instead of loading it into each heap. Books are built from game record files.
+#               Run from the command line, for example: python JanggiBook.py build book.jgb games.jgr
+
+import argparse
+import mmap
+import struct
+import sys
+
+from JanggiGame import SQUARE_INDEX, JanggiGame
+from JanggiRecord import read_games
+
+MAGIC = b'JGB1'
+
+# position hash, from square, to square and weight
+BOOK_ENTRY = struct.Struct('<QBBH')
+HASH_FIELD = struct.Struct('<Q')
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """
+    Read-only opening book backed by a memory-mapped book file. Can be used as a context manager, which closes the
+    file on exit.
+    """
+
+    def __init__(self, path):
+        """
+        Takes the path of a book file and maps it into memory. Raises ValueError if it is not a book file.
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(str(path) + " is not an opening book file")
+
+        if self._map[:len(MAGIC)] != MAGIC or (len(self._map) - len(MAGIC)) % BOOK_ENTRY.size:
+            self.close()
+            raise ValueError(str(path) + " is not an opening book file")
+
+        self._count = (len(self._map) - len(MAGIC)) // BOOK_ENTRY.size
+
+    def __len__(self):
+        """
+        Returns the number of entries in the book.
+        """
+        return self._count
+
+    def probe(self, key):
+        """
+        Takes a position hash and returns a list of (from square, to square, weight) for every book entry with that
+        hash, in file order.
+        """
+        book_map = self._map
+        entry_size = BOOK_ENTRY.size
+        low, high = 0, self._count
+
+        # finds the first entry whose hash is not below the key
+        while low < high:
+            middle = (low + high) // 2
+            if HASH_FIELD.unpack_from(book_map, len(MAGIC) + middle * entry_size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        for index in range(low, self._count):
+            entry_hash, current_square, new_square, weight = BOOK_ENTRY.unpack_from(
+                book_map, len(MAGIC) + index * entry_size)
+            if entry_hash != key:
+                break
+            entries.append((current_square, new_square, weight))
+
+        return entries
+
+    def close(self):
+        """
+        Unmaps and closes the book file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def build_book(record_paths, path, max_plies=20, min_count=1):
+    """
+    Takes a list of game record file paths, the path of the book file to write, the number of opening plies of each
+    game to use and the number of games a move must be played in to be kept. Counts each (position, move) pair,
+    writes the book and returns the number of entries. Raises ValueError if a recorded move is illegal.
+    """
+    counts = {}
+
+    for record_path in record_paths:
+        for moves, result in read_games(record_path):
+            game = JanggiGame()
+            for current_position, new_position in moves[:max_plies]:
+                key = game.position_hash()
+                if game.make_move(current_position, new_position) is False:
+                    raise ValueError("illegal move " + current_position + "-" + new_position + " in " + str(record_path))
+                # passes are not worth keeping in a book
+                if current_position != new_position:
+                    entry = (key, SQUARE_INDEX[current_position], SQUARE_INDEX[new_position])
+                    counts[entry] = counts.get(entry, 0) + 1
+
+    entries = sorted((entry, count) for entry, count in counts.items() if count >= min_count)
+
+    with open(path, 'wb') as book_file:
+        book_file.write(MAGIC)
+        for (key, current_square, new_square), count in entries:
+            book_file.write(BOOK_ENTRY.pack(key, current_square, new_square, min(count, MAX_WEIGHT)))
+
+    return len(entries)
+
+
+def main(argv=None):
+    """
+    Command line entry point. Builds a book from game record files, or prints the book moves for a position.
+    """
+    parser = argparse.ArgumentParser(description="Build or probe a Janggi opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="build a book from game record files")
+    build_parser.add_argument("book", help="book file to write")
+    build_parser.add_argument("records", nargs="+", help="game record files to read")
+    build_parser.add_argument("--plies", type=int, default=20, help="opening plies of each game to use")
+    build_parser.add_argument("--min-count", type=int, default=1, help="games a move must be played in")
+
+    probe_parser = commands.add_parser("probe", help="print the book moves for a position")
+    probe_parser.add_argument("book", help="book file to read")
+    probe_parser.add_argument("--moves", default="", help="moves to play from the standard setup, e.g. c7-c6,c4-c5")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_book(args.records, args.book, args.plies, args.min_count)
+        print("entries: %d" % count)
+        return 0
+
+    game = JanggiGame()
+    for move in args.moves.split(',') if args.moves else []:
+        if game.push(tuple(move.split('-'))) is False:
+            print("illegal move " + move)
+            return 1
+
+    with OpeningBook(args.book) as book:
+        for (current_position, new_position), weight in game.book_moves(book):
+            print("%s-%s: %d" % (current_position, new_position, weight))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
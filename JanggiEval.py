@@ -0,0 +1,187 @@
+#: Description: Position evaluation for the Janggi rules engine. Scores material, piece-square bonuses and a mobility
+#               proxy (empty squares orthogonally next to chariots, cannons and horses). evaluate scores one game and
+#               can be passed to JanggiSearch as its leaf evaluator. evaluate_batch scores an (N, 90) array of cell
+#               codes, as made by encode_boards, for many positions at once with NumPy, which is optional and only
+#               needed for the batch functions. Run from the command line to compare the two, for example:
+#               python JanggiEval.py --positions 20000
+
+import argparse
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from JanggiGame import CODE_PIECES, PIECE_VALUES, JanggiGame
+
+
+def _piece_square_bonus(name, row, column):
+    """
+    Takes a piece name and a row and column counted from the owner's back rank, and returns the positional bonus.
+    """
+    # soldiers gain for each rank advanced past their starting rank
+    if name == 'Soldier':
+        return max(row - 3, 0) * 20
+    # horses and elephants gain towards the center files
+    if name in ('Horse', 'Elephant'):
+        return (4 - abs(column - 4)) * 5
+    return 0
+
+
+def _build_score_table():
+    """
+    Returns for each cell code a list indexed by square of the piece's value plus its positional bonus, positive for
+    red pieces and negative for blue ones.
+    """
+    table = [[0] * 90 for code in range(16)]
+
+    for code, (name, color) in CODE_PIECES.items():
+        for square in range(90):
+            row, column = square // 9, square % 9
+            if color == 'blue':
+                row = 9 - row
+            score = PIECE_VALUES[name] + _piece_square_bonus(name, row, column)
+            table[code][square] = score if color == 'red' else -score
+
+    return table
+
+
+# mobility points for each empty square orthogonally next to a piece of each kind
+MOBILITY_POINTS = {'Chariot': 8, 'Cannon': 4, 'Horse': 6}
+
+SCORE_TABLE = _build_score_table()
+MOBILITY_TABLE = [0] * 16
+for _code, (_name, _color) in CODE_PIECES.items():
+    MOBILITY_TABLE[_code] = MOBILITY_POINTS.get(_name, 0) * (1 if _color == 'red' else -1)
+
+# squares orthogonally next to each square
+NEIGHBORS = [[row * 9 + column for column, row in ((square % 9 - 1, square // 9), (square % 9 + 1, square // 9),
+                                                   (square % 9, square // 9 - 1), (square % 9, square // 9 + 1))
+              if 0 <= column < 9 and 0 <= row < 10] for square in range(90)]
+
+
+def evaluate(game, color):
+    """
+    Takes a game and a color and returns the score of the position from that player's point of view.
+    """
+    cells = game._cells
+    score = 0
+
+    for square, code in enumerate(cells):
+        if not code:
+            continue
+        score += SCORE_TABLE[code][square]
+        points = MOBILITY_TABLE[code]
+        if points:
+            for neighbor in NEIGHBORS[square]:
+                if not cells[neighbor]:
+                    score += points
+
+    return score if color == 'red' else -score
+
+
+def _require_numpy():
+    """
+    Raises ImportError if NumPy is not installed.
+    """
+    if np is None:
+        raise ImportError("NumPy is required for batch evaluation")
+
+
+def encode_boards(games):
+    """
+    Takes a list of games and returns an (N, 90) int8 array of their cell codes.
+    """
+    _require_numpy()
+    data = JanggiGame.encode_boards(games)
+    return np.frombuffer(data, dtype=np.int8).reshape(-1, 90)
+
+
+def evaluate_batch(boards, red_to_move=None):
+    """
+    Takes an (N, 90) array of cell codes and optionally an array of N booleans telling whether red is to move, and
+    returns an int array of N scores, from red's point of view or, if red_to_move is given, from the point of view
+    of the player to move. Scores equal those of evaluate.
+    """
+    _require_numpy()
+    codes = np.asarray(boards, dtype=np.intp).reshape(-1, 90)
+    count = codes.shape[0]
+
+    scores = np.asarray(SCORE_TABLE, dtype=np.int32)[codes, np.arange(90)].sum(axis=1)
+
+    # empty orthogonal neighbors of every square, from a board padded with occupied squares
+    empty = np.zeros((count, 12, 11), dtype=np.int32)
+    empty[:, 1:11, 1:10] = (codes == 0).reshape(count, 10, 9)
+    neighbors = empty[:, :-2, 1:-1] + empty[:, 2:, 1:-1] + empty[:, 1:-1, :-2] + empty[:, 1:-1, 2:]
+    mobility = np.asarray(MOBILITY_TABLE, dtype=np.int32)[codes]
+    scores += (mobility * neighbors.reshape(count, 90)).sum(axis=1)
+
+    if red_to_move is not None:
+        scores = np.where(np.asarray(red_to_move, dtype=bool), scores, -scores)
+
+    return scores
+
+
+def random_positions(count, seed=0, max_moves=80):
+    """
+    Takes a number of positions, a random seed and a maximum game length, and returns that many games reached by
+    playing random legal moves from the standard setup.
+    """
+    generator = random.Random(seed)
+    games = []
+
+    while len(games) < count:
+        game = JanggiGame()
+        for num in range(generator.randint(0, max_moves)):
+            if game.get_game_state() != 'UNFINISHED':
+                break
+            game.push(generator.choice(game.legal_moves()))
+        games.append(game)
+
+    return games
+
+
+def main(argv=None):
+    """
+    Command line entry point. Scores random positions one game at a time and as a batch, checks that the scores
+    agree and prints positions per second for both.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark Janggi position evaluation.")
+    parser.add_argument("--positions", type=int, default=20000, help="number of positions to score")
+    parser.add_argument("--distinct", type=int, default=500, help="distinct random positions to repeat")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args(argv)
+
+    distinct = random_positions(min(args.distinct, args.positions), args.seed)
+    games = [distinct[num % len(distinct)] for num in range(args.positions)]
+
+    start = time.perf_counter()
+    single_scores = [evaluate(game, 'red') for game in games]
+    single_seconds = time.perf_counter() - start
+    print("per game: %d positions %.3f seconds %.0f positions/sec" % (
+        len(games), single_seconds, len(games) / single_seconds if single_seconds else 0))
+
+    if np is None:
+        print("NumPy is not installed, batch evaluation skipped")
+        return 0
+
+    start = time.perf_counter()
+    boards = encode_boards(games)
+    encode_seconds = time.perf_counter() - start
+    batch_scores = evaluate_batch(boards)
+    batch_seconds = time.perf_counter() - start
+    print("batch: %d positions %.3f seconds (%.3f encoding) %.0f positions/sec" % (
+        len(games), batch_seconds, encode_seconds, len(games) / batch_seconds if batch_seconds else 0))
+
+    if batch_scores.tolist() != single_scores:
+        print("batch scores differ from per game scores")
+        return 1
+    print("scores agree")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
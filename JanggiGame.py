@@ -6,22 +6,320 @@
 #               next move. Player cannot make a move that places themselves in check.  A player cannot make a move
 #               that puts or leaves their general in check.The game ends when one player checkmates the other's general.
 
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Squares are numbered 0-89 internally, row by row starting from a1, so that square = (row - 1) * 9 + column - 1.
+# Algebraic positions such as 'e9' are only parsed at the public methods and translated with the tables below.
+COLUMNS = 'abcdefghi'
+SQUARE_NAMES = [column + str(row) for row in range(1, 11) for column in COLUMNS]
+SQUARE_INDEX = {name: square for square, name in enumerate(SQUARE_NAMES)}
+COLORS = ('red', 'blue')
+
+# diagonal lines of both fortresses, listed corner to corner through the center
+FORTRESS_DIAGONALS = [tuple(SQUARE_INDEX[name] for name in line) for line in
+                      (('d8', 'e9', 'f10'), ('f8', 'e9', 'd10'), ('d1', 'e2', 'f3'), ('f1', 'e2', 'd3'))]
+FORTRESS_LINES = {'red': FORTRESS_DIAGONALS[2:], 'blue': FORTRESS_DIAGONALS[:2]}
+FORTRESS_SQUARES = {'red': [SQUARE_INDEX[column + str(row)] for row in range(1, 4) for column in 'def'],
+                    'blue': [SQUARE_INDEX[column + str(row)] for row in range(8, 11) for column in 'def']}
+
+
+def to_square(position):
+    """
+    Takes an algebraic position such as 'e9' and returns its square index, or None if it is not on the board.
+    """
+    return SQUARE_INDEX.get(position)
+
+
+def to_position(square):
+    """
+    Takes a square index and returns its algebraic position.
+    """
+    return SQUARE_NAMES[square]
+
+
+def _on_board(column, row):
+    """
+    Takes a zero based column and row and returns the square index, or None if it lies off the board.
+    """
+    if 0 <= column < 9 and 0 <= row < 10:
+        return row * 9 + column
+    return None
+
+
+def _build_rays():
+    """
+    Returns for each square the list of rays a chariot or cannon can travel along. A ray is a tuple of squares in
+    order of distance: the four orthogonal directions to the board edge, plus the fortress diagonal lines through
+    the square.
+    """
+    rays = []
+
+    for square in range(90):
+        column, row = square % 9, square // 9
+        square_rays = []
+
+        for column_step, row_step in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            ray = []
+            a_square = _on_board(column + column_step, row + row_step)
+            while a_square is not None:
+                ray.append(a_square)
+                a_square = _on_board(a_square % 9 + column_step, a_square // 9 + row_step)
+            if ray:
+                square_rays.append(tuple(ray))
+
+        for line in FORTRESS_DIAGONALS:
+            if square in line:
+                index = line.index(square)
+                if line[index + 1:]:
+                    square_rays.append(line[index + 1:])
+                if line[:index]:
+                    square_rays.append(tuple(reversed(line[:index])))
+
+        rays.append(square_rays)
+
+    return rays
+
+
+def _build_step_table(steps, fortress_color, fortress_only):
+    """
+    Takes a list of (column, row) steps, the color of the fortress whose diagonal lines the piece may follow and
+    whether the piece is confined to that fortress, and returns for each square a dict of destination squares to the
+    (empty) tuple of squares that must be clear.
+    """
+    table = []
+
+    for square in range(90):
+        column, row = square % 9, square // 9
+        moves = {}
+
+        for column_step, row_step in steps:
+            destination = _on_board(column + column_step, row + row_step)
+            if destination is None:
+                continue
+            if column_step and row_step:
+                if not any(square in line and destination in line for line in FORTRESS_LINES[fortress_color]):
+                    continue
+            if fortress_only and destination not in FORTRESS_SQUARES[fortress_color]:
+                continue
+            moves[destination] = ()
+
+        if fortress_only and square not in FORTRESS_SQUARES[fortress_color]:
+            moves = {}
+        table.append(moves)
+
+    return table
+
+
+def _build_leaper_table(orthogonal, diagonal):
+    """
+    Takes the number of orthogonal and then diagonal steps of a horse or elephant jump and returns for each square
+    a dict of destination squares to the tuple of leg squares that must be empty for the jump.
+    """
+    table = []
+
+    for square in range(90):
+        column, row = square % 9, square // 9
+        moves = {}
+
+        for column_step, row_step in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            for side in (-1, 1):
+                # diagonal continues away from the orthogonal step, turning towards side
+                diagonal_column = column_step if column_step else side
+                diagonal_row = row_step if row_step else side
+                legs = []
+                a_column, a_row = column + column_step * orthogonal, row + row_step * orthogonal
+                legs.append((a_column, a_row))
+                for num in range(diagonal - 1):
+                    a_column, a_row = a_column + diagonal_column, a_row + diagonal_row
+                    legs.append((a_column, a_row))
+                destination = _on_board(a_column + diagonal_column, a_row + diagonal_row)
+                if destination is not None:
+                    moves[destination] = tuple(_on_board(*leg) for leg in legs)
+
+        table.append(moves)
+
+    return table
+
+
+def _build_slider_table(rays, corners_only_on_diagonal):
+    """
+    Takes the ray table and returns for each square a dict of destination squares to the tuple of squares between
+    the start and the destination. A cannon only crosses the fortress diagonally from corner to corner.
+    """
+    table = []
+
+    for square in range(90):
+        moves = {}
+
+        for ray in rays[square]:
+            is_diagonal = ray[0] - square not in (1, -1, 9, -9)
+            if is_diagonal and corners_only_on_diagonal:
+                if len(ray) == 2:
+                    moves[ray[1]] = ray[:1]
+                continue
+            for index, destination in enumerate(ray):
+                moves[destination] = ray[:index]
+
+        table.append(moves)
+
+    return table
+
+
+ORTHOGONAL_STEPS = [(0, 1), (-1, 0), (0, -1), (1, 0)]
+DIAGONAL_STEPS = [(1, 1), (-1, -1), (1, -1), (-1, 1)]
+
+# built once at import: for each piece name and color, a list indexed by square of {destination: squares that must
+# be empty}. For a cannon the squares listed are those it jumps over, of which exactly one must be occupied.
+RAYS = _build_rays()
+_HORSE_TABLE = _build_leaper_table(1, 1)
+_ELEPHANT_TABLE = _build_leaper_table(1, 2)
+_CHARIOT_TABLE = _build_slider_table(RAYS, False)
+_CANNON_TABLE = _build_slider_table(RAYS, True)
+MOVE_TABLES = {
+    'General': {color: _build_step_table(ORTHOGONAL_STEPS + DIAGONAL_STEPS, color, True) for color in COLORS},
+    'Guard': {color: _build_step_table(ORTHOGONAL_STEPS + DIAGONAL_STEPS, color, True) for color in COLORS},
+    'Soldier': {'red': _build_step_table([(0, 1), (1, 0), (-1, 0), (1, 1), (-1, 1)], 'blue', False),
+                'blue': _build_step_table([(0, -1), (1, 0), (-1, 0), (1, -1), (-1, -1)], 'red', False)},
+    'Horse': {color: _HORSE_TABLE for color in COLORS},
+    'Elephant': {color: _ELEPHANT_TABLE for color in COLORS},
+    'Chariot': {color: _CHARIOT_TABLE for color in COLORS},
+    'Cannon': {color: _CANNON_TABLE for color in COLORS},
+}
+
+
+
+# compact cell codes: the low three bits give the piece kind and BLUE is added for blue pieces, so a board is 90 bytes
+# with 0 for an empty square
+GENERAL, GUARD, ELEPHANT, HORSE, CANNON, CHARIOT, SOLDIER = range(1, 8)
+BLUE = 8
+PIECE_KINDS = {'General': GENERAL, 'Guard': GUARD, 'Elephant': ELEPHANT, 'Horse': HORSE, 'Cannon': CANNON,
+               'Chariot': CHARIOT, 'Soldier': SOLDIER}
+PIECE_CODES = {(name, color): kind | (BLUE if color == 'blue' else 0)
+               for name, kind in PIECE_KINDS.items() for color in COLORS}
+CODE_PIECES = {code: name_and_color for name_and_color, code in PIECE_CODES.items()}
+
+# MOVE_TABLES indexed by cell code instead of name and color
+CODE_MOVE_TABLES = [None] * 16
+for (_name, _color), _code in PIECE_CODES.items():
+    CODE_MOVE_TABLES[_code] = MOVE_TABLES[_name][_color]
+
+# bitboards: bit n of a 90-bit int stands for square n, so the occupied squares of a file or fortress diagonal are
+# found by masking one int and the nearest piece along a ray is its lowest or highest set bit
+SQUARE_BITS = [1 << square for square in range(90)]
+FILE_MASKS = [sum(SQUARE_BITS[row * 9 + column] for row in range(10)) for column in range(9)]
+
+
+def _mask_of(squares):
+    """
+    Takes squares and returns the bitboard with their bits set.
+    """
+    mask = 0
+    for square in squares:
+        mask |= SQUARE_BITS[square]
+    return mask
+
+
+# for each square, one (ray, mask, increasing, positions) per ray in RAYS, where increasing tells whether the ray
+# runs towards higher square numbers and positions maps each square of the ray to its distance index
+RAY_MASKS = [[(ray, _mask_of(ray), ray[0] > square, {a_square: index for index, a_square in enumerate(ray)})
+              for ray in RAYS[square]] for square in range(90)]
+
+
+def _build_line_masks(square):
+    """
+    Takes a square and returns a dict of every square on a common row, column or diagonal with it, itself included,
+    to the bitboard of the squares from the first to the second inclusively.
+    """
+    masks = {square: SQUARE_BITS[square]}
+
+    for row_step, column_step in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+        row, column = square // 9 + row_step, square % 9 + column_step
+        mask = SQUARE_BITS[square]
+        while 0 <= row < 10 and 0 <= column < 9:
+            mask |= SQUARE_BITS[row * 9 + column]
+            masks[row * 9 + column] = mask
+            row, column = row + row_step, column + column_step
+
+    return masks
+
+
+# for each square, the masks of the lines read by the get_objects_in_* methods, keyed by the end square
+LINE_MASKS = [_build_line_masks(square) for square in range(90)]
+
+# CODE_MOVE_TABLES with each path given as a bitboard
+CODE_PATH_MASKS = [None if table is None else
+                   [{destination: _mask_of(path) for destination, path in moves.items()} for moves in table]
+                   for table in CODE_MOVE_TABLES]
+
+
+def _build_attack_table(color):
+    """
+    Takes a color and returns for each square a list of (source square, cell code, path mask) for every square from
+    which one of that player's generals, guards, soldiers, horses or elephants could move to it, where the path mask
+    holds the squares that must be empty. Chariots and cannons are found by walking RAYS from the square instead.
+    """
+    table = [[] for square in range(90)]
+
+    for name in ('Horse', 'Elephant', 'Soldier', 'General', 'Guard'):
+        for source, moves in enumerate(MOVE_TABLES[name][color]):
+            for destination, path in moves.items():
+                table[destination].append((source, PIECE_CODES[(name, color)], _mask_of(path)))
+
+    return table
+
+
+# for each cell code and square, the squares whose contents the piece's pseudo-legal moves depend on: its
+# destinations and the squares it passes over. AFFECTED_BY is the inverse, the squares from which some piece
+# depends on a given square.
+DEPENDENCY_MASKS = [None if table is None else
+                    [_mask_of(moves) | _mask_of(square for path in moves.values() for square in path) for moves in table]
+                    for table in CODE_MOVE_TABLES]
+AFFECTED_BY = [0] * 90
+for _table in DEPENDENCY_MASKS:
+    for _square, _mask in enumerate(_table or ()):
+        for _dependency in range(90):
+            if _mask & SQUARE_BITS[_dependency]:
+                AFFECTED_BY[_dependency] |= SQUARE_BITS[_square]
+
+ATTACK_TABLES = {color: _build_attack_table(color) for color in COLORS}
+
+
+def _build_zobrist_keys():
+    """
+    Returns the random 64-bit keys used to hash positions: a list indexed by cell code of one key per square, and
+    the key for red to move. The generator is seeded so that hashes are stable between runs.
+    """
+    generator = random.Random(0x4A414E474749)
+    piece_keys = [None] * 16
+    for name in MOVE_TABLES:
+        for color in COLORS:
+            piece_keys[PIECE_CODES[(name, color)]] = [generator.getrandbits(64) for square in range(90)]
+    return piece_keys, generator.getrandbits(64)
+
+
+ZOBRIST_PIECE_KEYS, ZOBRIST_RED_TO_MOVE = _build_zobrist_keys()
+
 class Piece:
     """
-    Parent class for a Janggi piece.
+    Parent class for a Janggi piece. Pieces use __slots__ so that each one only stores its color, name and square.
     """
 
+    __slots__ = ('_color', '_name', '_square')
+
     def __init__(self, color, position):
         """
-        Initializes private data members color and position for a piece.
+        Initializes private data members color and square for a piece.
         """
         self._color = color
-        self._position = position
+        self._square = SQUARE_INDEX.get(position)
         self._name = ""
 
     def __repr__(self):
         """'Dunder' method to represent objects with descriptors"""
-        return self._color[0:1] + self._name[0:2] + self._position[0:1].upper()
+        return self._color[0:1] + self._name[0:2] + self.get_position()[0:1].upper()
 
     def get_name(self):
         """
@@ -37,22 +335,59 @@ class Piece:
 
     def get_position(self):
         """
-        Returns position of piece
+        Returns position of piece, or 'captured' if it has been taken off the board
         """
-        return self._position
+        if self._square is None:
+            return "captured"
+        return SQUARE_NAMES[self._square]
 
     def set_position(self, position):
         """
         Sets position of piece
         """
-        self._position = position
+        self._square = SQUARE_INDEX.get(position)
+
+    def get_square(self):
+        """
+        Returns square index of piece, or None if it has been captured
+        """
+        return self._square
+
+    def set_square(self, square):
+        """
+        Sets square index of piece
+        """
+        self._square = square
+
+    def move_table(self):
+        """
+        Returns the precomputed dict of destination squares from the piece's current square, each mapped to the
+        squares the piece passes over on the way. The dict is shared and must not be modified.
+        """
+        return MOVE_TABLES[self._name][self._color][self._square]
+
+    def get_code(self):
+        """
+        Returns the compact cell code of the piece
+        """
+        return PIECE_CODES[(self._name, self._color)]
+
+    def possible_moves(self):
+        """
+        Takes no parameters and returns the list of squares the piece could move to on an empty board.
+        """
+        return list(self.move_table())
 
 
 class Soldier(Piece):
     """
-     Represents a Soldier piece. Child class of Piece. Name's the piece and defines its move set.
+     Represents a Soldier piece. Child class of Piece. Name's the piece and defines its move set. A soldier
+     can move one position forward or sideways. In addition, it can move diagonally forward when in fortress.
+     Soldier cannot move backwards.
      """
 
+    __slots__ = ()
+
     def __init__(self, color, position):
         """
          Initializes private data members for Soldier piece.
@@ -60,55 +395,15 @@ class Soldier(Piece):
         super().__init__(color, position)
         self._name = "Soldier"
 
-    def possible_moves(self):
-        """
-         Takes no parameters. Takes current position and maps out possible positions for piece to move. A soldier
-         can move one position forward or sideways. In addition, it can move diagonally forward when in fortress.
-         Soldier cannot move backwards.
-         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-
-        if self._color == "blue":
-
-            possible_move_list = [(column, row - 1), (column + 1, row), (column - 1, row)]
-
-            if self._position == 'e2':
-                possible_move_list += [(column - 1, row - 1), (column + 1, row - 1)]
-            elif self._position == 'd3':
-                possible_move_list.append((column + 1, row - 1))
-            elif self._position == 'f3':
-                possible_move_list.append((column - 1, row - 1))
-
-        else:
-
-            possible_move_list = [(column, row + 1), (column + 1, row), (column - 1, row)]
-
-            if self._position == 'e9':
-                possible_move_list += [(column - 1, row + 1), (column + 1, row + 1)]
-
-            elif self._position == 'd8':
-                possible_move_list.append((column + 1, row + 1))
-            elif self._position == 'f8':
-                possible_move_list.append((column - 1, row + 1))
-
-        for (col, row) in possible_move_list:
-            if col not in range(1, 10) or row not in range(1, 11):
-                possible_move_list.remove((col, row))
-
-        if len(possible_move_list) == 0:
-            return []
-        else:
-            return possible_move_list
-
 
 class General(Piece):
     """
     Represents a General piece. Child class of Piece. Name's the piece and defines its move set.
+    A general can move one position in any direction, but only within its fortress.
     """
 
+    __slots__ = ()
+
     def __init__(self, color, position):
         """
         Initializes private data members for General piece.
@@ -116,36 +411,6 @@ class General(Piece):
         super().__init__(color, position)
         self._name = "General"
 
-    def possible_moves(self):
-        """
-        Takes no parameters. Takes current position and maps out possible positions for piece to move depending on move set.
-        A general can move one position in any direction, but only within its fortress.
-         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-
-        possible_move_list = [(column, row + 1), (column - 1, row), (column, row - 1), (column + 1, row)]
-        diagonal_valid_square = ['d8', 'f8', 'e9', 'd10', 'f10', 'd1', 'f1', 'e2', 'd3', 'f3']
-
-        if self._position in diagonal_valid_square:
-            possible_move_list += [(column + 1, row + 1), (column - 1, row - 1), (column + 1, row - 1),
-                                   (column - 1, row + 1)]
-
-        final_possible_move_list = []
-
-        if self._color == "blue":
-            for (col, row) in possible_move_list:
-                if col in range(4, 7) and row in range(8, 11):
-                    final_possible_move_list += [(col, row)]
-        else:
-            for (col, row) in possible_move_list:
-                if col in range(4, 7) and row in range(1, 4):
-                    final_possible_move_list += [(col, row)]
-
-        return final_possible_move_list
-
 
 class Guard(Piece):
     """
@@ -153,6 +418,8 @@ class Guard(Piece):
     A guard can move one position in any direction, but only within its fortress.
     """
 
+    __slots__ = ()
+
     def __init__(self, color, position):
         """
         Initializes private data members for Guard piece.
@@ -160,42 +427,16 @@ class Guard(Piece):
         super().__init__(color, position)
         self._name = "Guard"
 
-    def possible_moves(self):
-        """
-        Takes no parameters. Takes current position and maps out possible positions for piece to move depending on move set.
-        An elephant can move one position orthogonally and then one position diagonally, but cannot jump over pieces.
-         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-
-        possible_move_list = [(column, row + 1), (column - 1, row), (column, row - 1), (column + 1, row)]
-        diagonal_valid_square = ['d8', 'f8', 'e9', 'd10', 'f10', 'd1', 'f1', 'e2', 'd3', 'f3']
-
-        if self._position in diagonal_valid_square:
-            possible_move_list += [(column + 1, row + 1), (column - 1, row - 1), (column + 1, row - 1),
-                                   (column - 1, row + 1)]
-
-        final_possible_move_list = []
-
-        if self._color == "blue":
-            for (col, row) in possible_move_list:
-                if col in range(4, 7) and row in range(8, 11):
-                    final_possible_move_list += [(col, row)]
-        else:
-            for (col, row) in possible_move_list:
-                if col in range(4, 7) and row in range(1, 4):
-                    final_possible_move_list += [(col, row)]
-
-        return final_possible_move_list
-
 
 class Chariot(Piece):
     """
     Represents a Chariot piece. Child class of Piece. Name's the piece and defines its move set.
+    A chariot can move unlimited positions in one way orthogonally, but cannot jump over pieces. In addition, it can
+    move unlimited positions in one way diagonally in fortress, but only in straight lines.
     """
 
+    __slots__ = ()
+
     def __init__(self, color, position):
         """
         Initializes private data members for Chariot piece.
@@ -203,51 +444,15 @@ class Chariot(Piece):
         super().__init__(color, position)
         self._name = "Chariot"
 
-    def possible_moves(self):
-        """
-        Takes no parameters. Takes current position and maps out possible positions for piece to move depending on move set.
-        A chariot can move unlimited positions in one way orthogonally, but cannot jump over pieces. In addition, it can
-        move unlimited positions in one way diagonally in fortress, but only in straight lines.
-         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-        possible_move_list = []
-
-        for num in range(1, 11):
-            possible_move_list.append((column,num))
-
-        for num in range(1,10):
-            possible_move_list.append((num,row))
-
-        possible_move_list.remove((column,row))
-        possible_move_list.remove((column,row))
-
-        if self._position in ['d8','e9','f10']:
-            possible_move_list += [(4,8),(5,9),(6,10)]
-            possible_move_list.remove((column, row))
-
-        if self._position in ['f8','e9','d10']:
-            possible_move_list += [(6,8),(5,9),(4,10)]
-            possible_move_list.remove((column,row))
-
-        if self._position in ['d1', 'e2', 'f3']:
-                possible_move_list += [(4, 1), (5, 2), (6, 3)]
-                possible_move_list.remove((column,row))
-
-        if self._position in ['f1', 'e2', 'd3']:
-                possible_move_list += [(6, 1), (5, 2), (4, 3)]
-                possible_move_list.remove((column,row))
-
-
-        return possible_move_list
 
 class Horse(Piece):
     """
-    Represents a Horse piece. Child class of Piece. Name's the piece and defines its move set. A horse can
+    Represents a Horse piece. Child class of Piece. Name's the piece and defines its move set.
+    A horse can move one position orthogonally and then one position diagonally, but cannot jump over pieces.
     """
 
+    __slots__ = ()
+
     def __init__(self, color, position):
         """
         Initializes private data members for a Horse piece.
@@ -255,34 +460,15 @@ class Horse(Piece):
         super().__init__(color, position)
         self._name = "Horse"
 
-    def possible_moves(self):
-        """
-        Takes no parameters. Takes current position and maps out possible positions for piece to move depending on move set.
-        A horse can move one position orthogonally and then one position diagonally, but cannot jump over pieces.
-         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-        possible_move_list = [(column - 1, row - 2), (column + 1, row - 2), (column + 2, row - 1),
-                              (column + 2, row + 1), (column + 1, row + 2), (column - 1, row + 2),
-                              (column - 2, row - 1), (column - 2, row + 1)]
-
-        final_move_list = []
-
-        for (col, row) in possible_move_list:
-            if col in range(1, 10) and row in range(1, 11):
-                final_move_list += [(col, row)]
-
-        return final_move_list
-
-
 
 class Elephant(Piece):
     """
     Represents an Elephant piece. Child class of Piece. Name's the piece and defines its move set.
+    An elephant can move one position orthogonally and then two positions diagonally, but cannot jump over pieces.
     """
 
+    __slots__ = ()
+
     def __init__(self, color, position):
         """
         Initializes private data members for an Elephant piece.
@@ -291,81 +477,182 @@ class Elephant(Piece):
         self._name = "Elephant"
 
 
-    def possible_moves(self):
+class Cannon(Piece):
+    """
+    Represent a Cannon piece. Child class of Piece. Name's the piece and defines its move set.
+    A cannon can move unlimited positions in one way orthogonally, but only if there is exactly one piece between.
+    A cannon cannot capture another cannon or jump over another cannon. A cannon can also move diagonally within
+    fortress if its in a corner.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, color, position):
         """
-        Takes no parameters. Takes current position and maps out possible positions for piece to move depending on move set.
-        An elephant can move one position orthogonally and then two positions diagonally, but cannot jump over pieces.
+        Initializes private data members for Cannon piece.
         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
+        super().__init__(color, position)
+        self._name = "Cannon"
 
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-        possible_move_list = [(column - 2, row - 3), (column + 2, row - 3), (column + 3, row - 2),
-                              (column + 3, row + 2), (column + 2, row + 3), (column - 2, row + 3),
-                              (column - 3, row - 2), (column - 3, row + 2)]
 
-        final_move_list = []
+# material values in hundredths of a soldier-ish unit, following the usual Janggi point count. Used by evaluation and
+# to order captures in search.
+PIECE_VALUES = {'General': 0, 'Chariot': 1300, 'Cannon': 700, 'Horse': 500, 'Elephant': 300, 'Guard': 300,
+                'Soldier': 200}
 
-        for (col, row) in possible_move_list:
-            if col in range(1, 10) and row in range(1, 11):
-                final_move_list += [(col, row)]
+# PIECE_VALUES indexed by piece kind
+KIND_VALUES = [0] * 8
+for _name, _kind in PIECE_KINDS.items():
+    KIND_VALUES[_kind] = PIECE_VALUES[_name]
 
-        return final_move_list
+# letters for each cell code in FEN-style text, upper case for red and lower case for blue
+FEN_LETTERS = {PIECE_CODES[(name, color)]: letter.upper() if color == 'red' else letter
+               for name, letter in (('General', 'k'), ('Guard', 'a'), ('Elephant', 'b'), ('Horse', 'n'),
+                                    ('Cannon', 'c'), ('Chariot', 'r'), ('Soldier', 'p'))
+               for color in COLORS}
+FEN_CODES = {letter: code for code, letter in FEN_LETTERS.items()}
 
+# the standard setup, ranks listed from row 10 down to row 1
+START_FEN = "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/RBNA1ABNR b 0 1"
 
-class Cannon(Piece):
+PIECE_CLASSES = {'General': General, 'Guard': Guard, 'Elephant': Elephant, 'Horse': Horse, 'Cannon': Cannon,
+                 'Chariot': Chariot, 'Soldier': Soldier}
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'size', 'max_size'])
+
+
+class Position(namedtuple('Position', ['cells', 'players_turn', 'position_hash'])):
     """
-    Represent a Cannon piece. Child class of Piece. Name's the piece and defines its move set.
+    Immutable snapshot of a position: 90 cell codes as bytes from a1 to i10, 'red' or 'blue' for the player to move
+    and the Zobrist hash. Being a tuple of immutable values it can be shared between threads without locks, and it
+    hashes by its position hash, so it is cheap to use as a dict key. Made by JanggiGame.snapshot.
     """
 
-    def __init__(self, color, position):
+    __slots__ = ()
+
+    def __hash__(self):
+        return self.position_hash
+
+    def piece_at(self, position):
         """
-        Initializes private data members for Advisor piece.
+        Takes an algebraic position and returns the (name, color) of the piece there, or None if it is empty.
         """
-        super().__init__(color, position)
-        self._name = "Cannon"
+        code = self.cells[SQUARE_INDEX[position]]
+        return CODE_PIECES[code] if code else None
 
-    def possible_moves(self):
+
+class ValidationCache:
+    """
+    Bounded least-recently-used cache of move legality keyed by (position hash, from square, to square). Because the
+    hash covers the pieces and the player to move, an entry can never be read back for a different position, so
+    nothing has to be invalidated when a move is made or retracted. Safe to share between threads.
+    """
+
+    def __init__(self, max_size=1 << 16):
         """
-        Takes no parameters. Takes current position and maps out possible positions for piece to move depending on move set.
-        A cannot can move unlimited positions in one way orthogonally, but only if there is exactly one piece between.
-        A cannon cannot capture another cannon or jump over another cannon. A cannon can also capture diagonally within
-        fortress if its in a corner.
-         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
+        Takes the number of entries to keep and initializes an empty cache.
+        """
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        # another thread could evict an entry between reading it and marking it recently used
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Takes a key and returns its cached result, or None if it is not cached.
+        """
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self._misses += 1
+                return None
 
-        column = key[self._position[0]]
-        row = int(self._position[1:])
-        possible_move_list = []
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return result
 
-        for num in range(1, 11):
-            possible_move_list.append((column,num))
+    def put(self, key, result):
+        """
+        Takes a key and its result and stores them, dropping the least recently used entry if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = result
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
 
-        for num in range(1,10):
-            possible_move_list.append((num,row))
+    def clear(self):
+        """
+        Takes no parameters and removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
 
-        possible_move_list.remove((column,row))
-        possible_move_list.remove((column,row))
+    def info(self):
+        """
+        Takes no parameters and returns a CacheInfo of hits, misses, current size and maximum size.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, len(self._entries), self._max_size)
 
-        if self._position in ['d8','f10']:
-            possible_move_list += [(4,8),(6,10)]
-            possible_move_list.remove((column, row))
 
-        if self._position in ['f8','d10']:
-            possible_move_list += [(6,8),(4,10)]
-            possible_move_list.remove((column,row))
+# shared by every game that turns caching on, so replaying games that reach the same positions, such as the same
+# openings, reuses results across games
+VALIDATION_CACHE = ValidationCache()
 
-        if self._position in ['d1', 'f3']:
-                possible_move_list += [(4, 1), (6, 3)]
-                possible_move_list.remove((column,row))
+# plies after which a game driven through make_move ends as a draw, unless changed with set_draw_rules
+MAX_PLIES = 400
 
-        if self._position in ['f1', 'd3']:
-                possible_move_list += [(6, 1), (4, 3)]
-                possible_move_list.remove((column,row))
+# methods timed when profiling is enabled, with the label their calls are counted under. Methods taking a square
+# first are also counted per kind of piece on it, such as 'is_valid_move:Cannon'.
+PROFILED_METHODS = {'make_move': 'make_move', '_push': 'push', '_pop': 'pop',
+                    '_is_valid_move': 'is_valid_move', '_piece_moves': 'generate_moves',
+                    'get_objects_in_row': 'get_objects_in_row', 'get_objects_in_column': 'get_objects_in_column',
+                    'get_objects_in_diagonal': 'get_objects_in_diagonal', '_is_self_check': 'self_check_test',
+                    '_gives_check': 'check_test', '_is_attacked': 'attack_probe', '_has_legal_move': 'checkmate_test'}
+PER_PIECE_METHODS = ('_is_valid_move', '_piece_moves')
 
+# label -> [calls, total nanoseconds, longest nanoseconds, calls by duration bucket], where bucket n counts calls
+# taking less than 2 ** n nanoseconds
+PROFILE_STATS = {}
 
 
-        return possible_move_list
+def _profiled(method, label, per_piece):
+    """
+    Takes a JanggiGame method, its label and whether to count it per kind of piece, and returns a wrapper that
+    times each call into PROFILE_STATS. Times include nested profiled calls.
+    """
+    perf_counter_ns = time.perf_counter_ns
+
+    def wrapper(self, *args, **kwargs):
+        key = label
+        if per_piece and args:
+            code = self._cells[args[0]]
+            if code:
+                key = label + ":" + CODE_PIECES[code][0]
+
+        start = perf_counter_ns()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            duration = perf_counter_ns() - start
+            entry = PROFILE_STATS.get(key)
+            if entry is None:
+                entry = PROFILE_STATS[key] = [0, 0, 0, [0] * 64]
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]:
+                entry[2] = duration
+            entry[3][min(duration.bit_length(), 63)] += 1
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    return wrapper
 
 
 class JanggiGame:
@@ -373,12 +660,79 @@ class JanggiGame:
      get game state, player's turn and who is in check. Has methods that validate moves and check for objects within rows, columns and diagonals.
      Has method make_move that checks for a valid move and changes board and game states. """
 
+    # cache of make_move legality results, or None while caching is off, as it is unless set_validation_cache
+    # turns it on. A hit saves about half the cost of make_move, but positions rarely repeat between varied games.
+    _validation_cache = None
+
+    # whether repetition and bikjang draw the game, and plies from the start after which it is drawn, or None
+    _draw_rules = True
+    _max_plies = MAX_PLIES
+
+    # original methods replaced by timing wrappers while profiling is enabled
+    _unprofiled_methods = {}
+
+    @classmethod
+    def enable_profiling(cls, enabled=True):
+        """
+        Takes whether profiling should be on and turns it on or off for every game. While it is on, the methods in
+        PROFILED_METHODS are replaced by timing wrappers; while it is off, the original methods run untouched, so
+        there is no cost. Counters are kept until reset_stats and are not safe to update from several threads.
+        Called on a subclass, it also wraps the methods the subclass inherits.
+        """
+        # kept per class, so that a subclass does not share or see its parent's
+        unprofiled = cls.__dict__.get('_unprofiled_methods')
+
+        if enabled and not unprofiled:
+            unprofiled = {}
+            for name, label in PROFILED_METHODS.items():
+                method = getattr(cls, name)
+                # a method inherited from a class that is being profiled already is wrapped from its original
+                wrapped = getattr(method, '__wrapped__', method)
+                # None marks a method the class inherits, which is removed again rather than copied onto it
+                unprofiled[name] = method if name in cls.__dict__ else None
+                setattr(cls, name, _profiled(wrapped, label, name in PER_PIECE_METHODS))
+            cls._unprofiled_methods = unprofiled
+        elif not enabled and unprofiled:
+            for name, method in unprofiled.items():
+                if method is None:
+                    delattr(cls, name)
+                else:
+                    setattr(cls, name, method)
+            cls._unprofiled_methods = {}
+
+    @staticmethod
+    def stats():
+        """
+        Takes no parameters and returns a snapshot of the profiling counters: a dict of each label to a dict of
+        calls, total seconds, mean and longest microseconds, and a histogram of calls by upper bound in microseconds.
+        """
+        snapshot = {}
+
+        for key, (calls, total, longest, buckets) in PROFILE_STATS.items():
+            snapshot[key] = {'calls': calls, 'seconds': total / 1e9, 'mean_us': total / calls / 1e3,
+                             'max_us': longest / 1e3,
+                             'histogram_us': {(1 << bucket) / 1e3: count for bucket, count in enumerate(buckets)
+                                              if count}}
+
+        return snapshot
+
+    @staticmethod
+    def reset_stats():
+        """
+        Takes no parameters and clears the profiling counters.
+        """
+        PROFILE_STATS.clear()
+
     def __init__(self):
         self._game_state = "UNFINISHED"
         self._players_turn = "tbd"
         self._is_in_check = ""
         self._captured_list_red = []
         self._captured_list_blue = []
+        self._history = []
+        # plies played and plies since the last capture before the first recorded move, for FEN move counters
+        self._start_ply = 0
+        self._start_clock = 0
 
         # initialize pieces
         self._red_soldier_1 = Soldier("red", "a4")
@@ -423,93 +777,50 @@ class JanggiGame:
                             self._blue_general,self._blue_guard_1,self._blue_guard_2,self._blue_chariot_1,self._blue_chariot_2,
                             self._blue_horse_1,self._blue_horse_2,self._blue_elephant_1,self._blue_elephant_2,self._blue_cannon_1,self._blue_cannon_2]
 
-        # places game pieces in their initial positions
-        self._game_board = [[], [None, self._red_chariot_1, None, None, self._red_soldier_1, None, None,
-                                 self._blue_soldier_1, None, None, self._blue_chariot_1],
-                            [None, self._red_elephant_1, None, self._red_cannon_1, None, None, None, None,
-                             self._blue_cannon_1, None, self._blue_elephant_1],
-                            [None, self._red_horse_1, None, None, self._red_soldier_2, None, None, self._blue_soldier_2,
-                             None, None, self._blue_horse_1],
-                            [None, self._red_guard_1, None, None, None, None, None, None, None, None,
-                             self._blue_guard_1],
-                            [None, None, self._red_general, None, self._red_soldier_3, None, None, self._blue_soldier_3,
-                             None, self._blue_general, None],
-                            [None, self._red_guard_2, None, None, None, None, None, None, None, None,
-                             self._blue_guard_2],
-                            [None, self._red_elephant_2, None, None, self._red_soldier_4, None, None,
-                             self._blue_soldier_4, None, None, self._blue_elephant_2],
-                            [None, self._red_horse_2, None, self._red_cannon_2, None, None, None, None,
-                             self._blue_cannon_2, None, self._blue_horse_2],
-                            [None, self._red_chariot_2, None, None, self._red_soldier_5, None, None,
-                             self._blue_soldier_5, None, None, self._blue_chariot_2]]
+        # places game pieces in their initial positions on a flat board indexed by square
+        self._game_board = [None] * 90
+        for a_piece in self._red_pieces + self._blue_pieces:
+            self._game_board[a_piece.get_square()] = a_piece
+
+        # compact copy of the board holding one cell code per square, which move generation and check detection read
+        self._cells = bytearray(a_piece.get_code() if a_piece is not None else 0 for a_piece in self._game_board)
+        # bitboard of occupied squares
+        self._occupied = _mask_of(square for square in range(90) if self._cells[square])
+        # each piece's pseudo-legal moves by square, or None where they must be regenerated, and the bitboard of
+        # squares holding a list
+        self._move_lists = [None] * 90
+        self._listed = 0
+        # attacked_squares results by color, with the position hash they were computed for
+        self._attacks = {}
+
+        self._hash = self._compute_hash()
+        # number of times each position has been reached since the last capture, for threefold repetition. No
+        # earlier position can be reached again after a capture, so only these are kept.
+        self._hash_counts = {self._hash: 1}
+        # the same counts for positions reached before the first recorded move, as set by set_draw_state
+        self._prior_counts = {}
 
     def print_board(self):
         """
         Prints out game_board
         """
 
-        print("  ----------------------------------------------------------------")
-        print("1 |", self._game_board[1][1], "|", self._game_board[2][1], "|", self._game_board[3][1], "|",
-              self._game_board[4][1], "|",
-              self._game_board[5][1], "|", self._game_board[6][1], "|", self._game_board[7][1], "|",
-              self._game_board[8][1], "|",
-              self._game_board[9][1], "|",
-              " Ca = Cannon, Ch = Chariot, El = Elephant, Ho = Horse, Gu = Guard, Ge = General")
-        print("  ----------------------------------------------------------------")
-        print("2 |", self._game_board[1][2], "|", self._game_board[2][2], "|", self._game_board[3][2], "|",
-              self._game_board[4][2], "|",
-              self._game_board[5][2], "|", self._game_board[6][2], "|", self._game_board[7][2], "|",
-              self._game_board[8][2], "|",
-              self._game_board[9][2], "|", " ColorPieceColumn i.e rChA = red Chariot in column A,",
-              "bSoC = blue Soldier in column C")
-        print("  ----------------------------------------------------------------")
-        print("3 |", self._game_board[1][3], "|", self._game_board[2][3], "|", self._game_board[3][3], "|",
-              self._game_board[4][3], "|",
-              self._game_board[5][3], "|", self._game_board[6][3], "|", self._game_board[7][3], "|",
-              self._game_board[8][3], "|",
-              self._game_board[9][3], "|")
-        print("  ----------------------------------------------------------------")
-        print("4 |", self._game_board[1][4], "|", self._game_board[2][4], "|", self._game_board[3][4], "|",
-              self._game_board[4][4], "|",
-              self._game_board[5][4], "|", self._game_board[6][4], "|", self._game_board[7][4], "|",
-              self._game_board[8][4], "|",
-              self._game_board[9][4], "|")
-        print("  ----------------------------------------------------------------")
-        print("5 |", self._game_board[1][5], "|", self._game_board[2][5], "|", self._game_board[3][5], "|",
-              self._game_board[4][5], "|",
-              self._game_board[5][5], "|", self._game_board[6][5], "|", self._game_board[7][5], "|",
-              self._game_board[8][5], "|",
-              self._game_board[9][5], "|")
-        print("  ----------------------------------------------------------------")
-        print("6 |", self._game_board[1][6], "|", self._game_board[2][6], "|", self._game_board[3][6], "|",
-              self._game_board[4][6], "|",
-              self._game_board[5][6], "|", self._game_board[6][6], "|", self._game_board[7][6], "|",
-              self._game_board[8][6], "|",
-              self._game_board[9][6], "|")
-        print("  ----------------------------------------------------------------")
-        print("7 |", self._game_board[1][7], "|", self._game_board[2][7], "|", self._game_board[3][7], "|",
-              self._game_board[4][7], "|",
-              self._game_board[5][7], "|", self._game_board[6][7], "|", self._game_board[7][7], "|",
-              self._game_board[8][7], "|",
-              self._game_board[9][7], "|")
-        print("  ----------------------------------------------------------------")
-        print("8 |", self._game_board[1][8], "|", self._game_board[2][8], "|", self._game_board[3][8], "|",
-              self._game_board[4][8], "|",
-              self._game_board[5][8], "|", self._game_board[6][8], "|", self._game_board[7][8], "|",
-              self._game_board[8][8], "|",
-              self._game_board[9][8], "|")
-        print("  ----------------------------------------------------------------")
-        print("9 |", self._game_board[1][9], "|", self._game_board[2][9], "|", self._game_board[3][9], "|",
-              self._game_board[4][9], "|",
-              self._game_board[5][9], "|", self._game_board[6][9], "|", self._game_board[7][9], "|",
-              self._game_board[8][9], "|",
-              self._game_board[9][9], "|")
-        print("  ________________________________________________________________")
-        print("10|", self._game_board[1][10], "|", self._game_board[2][10], "|", self._game_board[3][10], "|",
-              self._game_board[4][10], "|",
-              self._game_board[5][10], "|", self._game_board[6][10], "|", self._game_board[7][10], "|",
-              self._game_board[8][10], "|",
-              self._game_board[9][10], "|")
+        for row in range(1, 11):
+            if row == 10:
+                print("  ________________________________________________________________")
+            else:
+                print("  ----------------------------------------------------------------")
+
+            line = [str(row) + " |" if row < 10 else "10|"]
+            for column in range(9):
+                line += [self._game_board[(row - 1) * 9 + column], "|"]
+
+            if row == 1:
+                line.append(" Ca = Cannon, Ch = Chariot, El = Elephant, Ho = Horse, Gu = Guard, Ge = General")
+            elif row == 2:
+                line += [" ColorPieceColumn i.e rChA = red Chariot in column A,", "bSoC = blue Soldier in column C"]
+
+            print(*line)
 
     def get_game_state(self):
         """
@@ -536,7 +847,8 @@ class JanggiGame:
 
     def is_in_check(self, color):
         """
-        Takes in a parameter a color and returns True or False if that player is in check
+        Takes in a parameter a color and returns True or False if that player is in check. Check is found once when
+        each move is made, by looking outward from the general's square, and read back here.
         """
 
         if color == 'blue':
@@ -553,691 +865,1018 @@ class JanggiGame:
         """
         print("blue pieces: ", self._captured_list_blue,"red pieces: ",self._captured_list_red)
 
-    def get_piece_from_position(self, position):
+    def set_validation_cache(self, enabled=True, cache=None):
         """
-        Takes a position column and row as parameters and returns the piece in that position
+        Takes whether make_move should cache which moves are legal in which positions and optionally the
+        ValidationCache to use, defaulting to VALIDATION_CACHE, which is shared by every game. Caching pays off when
+        the same positions are reached again, as when replaying many games with common openings.
         """
+        if enabled:
+            self._validation_cache = cache if cache is not None else VALIDATION_CACHE
+        else:
+            self._validation_cache = None
 
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
+    def validation_cache_info(self):
+        """
+        Takes no parameters and returns the hits, misses, size and maximum size of the cache make_move uses to
+        remember which moves are legal in which positions, or None if caching is turned off.
+        """
+        if self._validation_cache is None:
+            return None
+        return self._validation_cache.info()
+
+    def position_hash(self):
+        """
+        Takes no parameters and returns a 64-bit Zobrist hash of the pieces on the board and the player to move.
+        The hash is updated with each move rather than recomputed.
+        """
+        return self._hash
 
-        column = key[position[0]]
-        row = int(position[1:])
+    def compact_state(self):
+        """
+        Takes no parameters and returns the position as 91 bytes: one cell code per square from a1 to i10, followed by
+        1 if red is to move or 0 if blue is. After checkmate the checkmated player is named as the one to move, as in
+        snapshot. Captured pieces and move history are not included; draw_state gives what the draw rules need.
+        """
+        if self._game_state == "RED_WON" or self._game_state == "BLUE_WON":
+            red_to_move = self._game_state == "BLUE_WON"
+        else:
+            red_to_move = self._players_turn == 'red'
+        return bytes(self._cells) + (b'\x01' if red_to_move else b'\x00')
 
-        return self._game_board[column][row]
+    def snapshot(self):
+        """
+        Takes no parameters and returns the position as an immutable Position. Captured pieces and move history are
+        not included.
+        """
+        players_turn = 'red' if self._players_turn == 'red' else 'blue'
+        position_hash = self._hash
 
+        # after checkmate the turn stays with the winner, but the snapshot names the checkmated player as the one
+        # to move so that from_position finds the checkmate again
+        if self._game_state == "RED_WON" or self._game_state == "BLUE_WON":
+            loser = 'red' if self._game_state == "BLUE_WON" else 'blue'
+            if loser != players_turn:
+                players_turn = loser
+                position_hash ^= ZOBRIST_RED_TO_MOVE
 
-    def get_objects_in_row(self, start_position,end_position):
-        """Takes a start position and an end position as parameters and returns a list of pieces within a row inclusively.
+        return Position(bytes(self._cells), players_turn, position_hash)
+
+    @classmethod
+    def from_position(cls, position):
+        """
+        Takes a Position returned by snapshot and returns a new game set up in that position.
         """
+        game = cls.__new__(cls)
+        game._load_cells(position.cells, position.players_turn)
+        return game
 
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        reverse_key = {1:'a',2:'b',3:'c',4:'d',5:'e',6:'f',7:'g',8:'h',9:'i'}
-        end_column = key[end_position[0]]
-        end_row = int(end_position[1:])
-        start_column = key[start_position[0]]
-        start_row = int(start_position[1:])
+    @staticmethod
+    def encode_boards(games):
+        """
+        Takes an iterable of games and returns their boards as one bytes object of 90 cell codes per game, in the
+        order of compact_state, for loading many positions into an array at once.
+        """
+        return b"".join(game._cells for game in games)
 
-        if start_row !=end_row:
+    @classmethod
+    def from_compact_state(cls, state):
+        """
+        Takes 91 bytes returned by compact_state and returns a new game set up in that position.
+        """
+        if len(state) != 91:
+            raise ValueError("compact state must be 91 bytes")
 
-                    return False
+        game = cls.__new__(cls)
+        game._load_cells(state[:90], 'red' if state[90] else 'blue')
+        return game
 
-        if start_column not in range(1,10) or end_column not in range(1,10) or start_row not in range(1,11) or end_row not in range(1,11):
-            return False
+    def to_fen(self):
+        """
+        Takes no parameters and returns the position as FEN-style text: the ranks from row 10 down to row 1 separated
+        by '/', with upper case letters for red pieces, lower case for blue and digits for runs of empty squares,
+        then 'r' or 'b' for the player to move, the number of plies since the last capture and the move number.
+        """
+        cells = self._cells
+        ranks = []
+
+        for row in range(9, -1, -1):
+            rank = ""
+            empty = 0
+            for code in cells[row * 9:row * 9 + 9]:
+                if code:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += FEN_LETTERS[code]
+                else:
+                    empty += 1
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        # counts back through the history to the last capture
+        clock = 0
+        for record in reversed(self._history):
+            if record[2] is not None:
+                break
+            clock += 1
+        else:
+            clock += self._start_clock
 
-        object_list = []
-        row = start_row
+        move_number = (self._start_ply + len(self._history)) // 2 + 1
+        # the turn is not handed over after a checkmating move, but the text names the checkmated player as the
+        # one to move so that from_fen finds the checkmate again
+        if self._game_state == "RED_WON" or self._game_state == "BLUE_WON":
+            side = 'r' if self._game_state == "BLUE_WON" else 'b'
+        else:
+            side = 'r' if self._players_turn == 'red' else 'b'
+        return "%s %s %d %d" % ("/".join(ranks), side, clock, move_number)
 
-        if end_column > start_column:
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Takes FEN-style text as returned by to_fen and returns a new game set up in that position. The move counters
+        may be left off. Raises ValueError if the text cannot be read or the player not to move is in check.
+        """
+        fields = fen.split()
+        if len(fields) not in (2, 4) or fields[1] not in ('r', 'b'):
+            raise ValueError("FEN must give the ranks, the player to move and optionally the two move counters")
+
+        ranks = fields[0].split('/')
+        if len(ranks) != 10:
+            raise ValueError("FEN must give 10 ranks")
+
+        cells = bytearray(90)
+        for rank_number, rank in enumerate(ranks):
+            square = (9 - rank_number) * 9
+            end = square + 9
+            digits = ""
+            for letter in rank + "/":
+                if letter.isdigit():
+                    digits += letter
+                    continue
+                if digits:
+                    square += int(digits)
+                    digits = ""
+                if letter == "/":
+                    break
+                if letter not in FEN_CODES or square >= end:
+                    raise ValueError("bad FEN rank " + rank)
+                cells[square] = FEN_CODES[letter]
+                square += 1
+            if square != end:
+                raise ValueError("FEN rank " + rank + " does not have 9 squares")
+
+        players_turn = 'red' if fields[1] == 'r' else 'blue'
+        clock, ply = 0, 0
+        if len(fields) == 4:
+            try:
+                clock = int(fields[2])
+                ply = (int(fields[3]) - 1) * 2 + (players_turn == 'red')
+            except ValueError:
+                raise ValueError("FEN move counters must be numbers")
+
+        game = cls.__new__(cls)
+        game._load_cells(cells, players_turn, ply, clock)
+        return game
+
+    def _load_cells(self, cells, players_turn, start_ply=0, start_clock=0):
+        """
+        Takes 90 cell codes, the player to move and optionally the move counters, and replaces the position with
+        them, creating one piece per occupied square. Check and checkmate are worked out for the player to move.
+        Raises ValueError for an unknown code, if either player does not have exactly one general or if the player
+        not to move is in check.
+        """
+        self._red_pieces = []
+        self._blue_pieces = []
+        self._game_board = [None] * 90
+
+        for square, code in enumerate(cells):
+            if not code:
+                continue
+            if code not in CODE_PIECES:
+                raise ValueError("unknown piece code %d on %s" % (code, SQUARE_NAMES[square]))
+
+            name, color = CODE_PIECES[code]
+            a_piece = PIECE_CLASSES[name](color, SQUARE_NAMES[square])
+            self._game_board[square] = a_piece
+            if color == 'red':
+                self._red_pieces.append(a_piece)
+            else:
+                self._blue_pieces.append(a_piece)
+
+        for color, pieces in (('red', self._red_pieces), ('blue', self._blue_pieces)):
+            generals = [a_piece for a_piece in pieces if a_piece.get_name() == 'General']
+            if len(generals) != 1:
+                raise ValueError(color + " must have exactly one general")
+            if color == 'red':
+                self._red_general = generals[0]
+            else:
+                self._blue_general = generals[0]
+
+        self._cells = bytearray(cells)
+        self._occupied = _mask_of(square for square in range(90) if self._cells[square])
+        self._move_lists = [None] * 90
+        self._listed = 0
+        self._attacks = {}
+        self._players_turn = players_turn
+        self._captured_list_red = []
+        self._captured_list_blue = []
+        self._history = []
+        self._start_ply = start_ply
+        self._start_clock = start_clock
+        self._hash = self._compute_hash()
+        self._hash_counts = {self._hash: 1}
+        self._prior_counts = {}
+
+        # the player who just moved cannot have left their own general in check, or the player to move could
+        # capture it
+        opposing_color = 'blue' if players_turn == 'red' else 'red'
+        if self._is_attacked(self._get_side(opposing_color)[1].get_square(), players_turn):
+            raise ValueError(opposing_color + " is in check but it is " + players_turn + "'s turn")
+
+        # the player to move may already be in check, or checkmated
+        self._is_in_check = ""
+        self._game_state = "UNFINISHED"
+        if self._is_attacked(self._get_side(players_turn)[1].get_square(), opposing_color):
+            self._is_in_check = players_turn
+            if not self._has_legal_move(players_turn):
+                self._game_state = "BLUE_WON" if players_turn == 'red' else "RED_WON"
 
-            for num in range(start_column, end_column + 1):
-                a_position = reverse_key[num] + str(row)
-                a_piece = self.get_piece_from_position(a_position)
-                object_list.append(self.get_piece_from_position(a_position))
+    def _compute_hash(self):
+        """
+        Takes no parameters and computes the position hash from scratch by scanning the board.
+        """
+        position_hash = ZOBRIST_RED_TO_MOVE if self._players_turn == 'red' else 0
+
+        for square, code in enumerate(self._cells):
+            if code:
+                position_hash ^= ZOBRIST_PIECE_KEYS[code][square]
 
+        return position_hash
 
-        elif start_column > end_column:
-            for num in range(end_column, start_column + 1):
-                a_position = reverse_key[num] + str(row)
-                a_piece = self.get_piece_from_position(a_position)
-                object_list.append(self.get_piece_from_position(a_position))
+    def get_piece_from_position(self, position):
+        """
+        Takes a position column and row as parameters and returns the piece in that position
+        """
+        return self._game_board[SQUARE_INDEX[position]]
 
+    def _get_objects_in_line(self, start_square, end_square):
+        """Takes a start square and an end square on a common line and returns the pieces from start to end inclusively.
+        """
+        object_list = []
+        board = self._game_board
+
+        # only the occupied squares of the line are visited, lowest bit first
+        blockers = self._occupied & LINE_MASKS[start_square][end_square]
+        while blockers:
+            lowest = blockers & -blockers
+            object_list.append(board[lowest.bit_length() - 1])
+            blockers ^= lowest
+
+        if end_square < start_square:
             object_list.reverse()
 
-        else:
-            object_list.append(self.get_piece_from_position(start_position))
+        return object_list
 
-        final_object_list = []
+    def get_objects_in_row(self, start_position,end_position):
+        """Takes a start position and an end position as parameters and returns a list of pieces within a row inclusively.
+        """
+        start_square = SQUARE_INDEX.get(start_position)
+        end_square = SQUARE_INDEX.get(end_position)
 
-        for an_object in object_list:
-            if an_object is not None:
-                final_object_list.append(an_object)
+        if start_square is None or end_square is None or start_square // 9 != end_square // 9:
+            return False
 
-        return final_object_list
+        return self._get_objects_in_line(start_square, end_square)
 
     def get_objects_in_column(self, start_position,end_position):
         """Takes a start position and an end position as parameters and returns pieces within that column in a list inclusively.
         """
+        start_square = SQUARE_INDEX.get(start_position)
+        end_square = SQUARE_INDEX.get(end_position)
 
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        end_column = key[end_position[0]]
-        end_row = int(end_position[1:])
-        start_column = key[start_position[0]]
-        start_row = int(start_position[1:])
-
-        if start_column != end_column:
+        if start_square is None or end_square is None or start_square % 9 != end_square % 9:
             return False
 
-        if start_column not in range(1, 10) or end_column not in range(1, 10) or start_row not in range(1,11) or end_row not in range(1, 11):
-            return False
+        return self._get_objects_in_line(start_square, end_square)
 
-        object_list = []
+    def get_objects_in_diagonal(self, start_position,end_position):
 
-        if end_row > start_row:
+        """Takes a start position and an end position as parameters and returns pieces in that diagonal inclusively.
+        """
+        start_square = SQUARE_INDEX.get(start_position)
+        end_square = SQUARE_INDEX.get(end_position)
 
-            for num in range(start_row, end_row + 1):
-                a_position = start_position[0] + str(num)
-                a_piece = self.get_piece_from_position(a_position)
-                object_list.append(self.get_piece_from_position(a_position))
+        if start_square is None or end_square is None:
+            return False
 
+        if abs(end_square % 9 - start_square % 9) != abs(end_square // 9 - start_square // 9):
+            return False
 
-        elif start_row > end_row:
-            for num in range(end_row, start_row + 1):
-                a_position = start_position[0] + str(num)
-                a_piece = self.get_piece_from_position(a_position)
-                object_list.append(self.get_piece_from_position(a_position))
+        return self._get_objects_in_line(start_square, end_square)
 
-            object_list.reverse()
+    def is_valid_move(self,current_position,new_position):
+        """Takes as parameters a current position and new position and returns True or False depending on validity of move"""
 
-        else:
-            object_list.append(self.get_piece_from_position(start_position))
+        current_square = SQUARE_INDEX.get(current_position)
+        new_square = SQUARE_INDEX.get(new_position)
 
-        final_object_list = []
+        if current_square is None or new_square is None:
+            return False
 
-        for an_object in object_list:
-            if an_object is not None:
-                final_object_list.append(an_object)
+        return self._is_valid_move(current_square, new_square)
 
-        return final_object_list
+    def _is_valid_move(self, current_square, new_square):
+        """Takes as parameters a current square and new square and returns True or False depending on validity of move"""
 
-    def get_objects_in_diagonal(self, start_position,end_position):
+        cells = self._cells
+        code = cells[current_square]
 
-        """Takes a start position and an end position as parameters and returns pieces in that diagonal inclusively.
-        """
+        if not code:
+            return False
 
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        reverse_key = {1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f', 7: 'g', 8: 'h', 9: 'i'}
-        end_column = key[end_position[0]]
-        end_row = int(end_position[1:])
-        start_column = key[start_position[0]]
-        start_row = int(start_position[1:])
+        target = cells[new_square]
 
-        if abs(end_column-start_column) != abs(end_row-start_row):
+        if target and (target & BLUE) == (code & BLUE):
             return False
 
-        if start_column not in range(1, 10) or end_column not in range(1, 10) or start_row not in range(1,11) or end_row not in range(1, 11):
+        path_mask = CODE_PATH_MASKS[code][current_square].get(new_square)
+
+        if path_mask is None:
             return False
 
-        object_list = []
+        blockers = self._occupied & path_mask
 
-        if end_column > start_column:
+        # Ensures that cannon has exactly one piece to jump over, is not jumping over a cannon and is not capturing another cannon
+        if code & 7 == CANNON:
+            if target & 7 == CANNON:
+                return False
+            if not blockers or blockers & (blockers - 1):
+                return False
+            return cells[blockers.bit_length() - 1] & 7 != CANNON
+
+        # Ensures that chariot, horse and elephant are not jumping over pieces. Path is empty for the other pieces.
+        return not blockers
+
+    def _is_attacked(self, square, color):
+        """Takes a square and a color and returns True if one of that player's pieces could move to that square,
+        capturing whatever stands there. Only the lines and jump squares that lead to the square are examined."""
+
+        cells = self._cells
+        chariot = CHARIOT | BLUE if color == 'blue' else CHARIOT
+        cannon = CANNON | BLUE if color == 'blue' else CANNON
+        target_is_cannon = cells[square] & 7 == CANNON
+
+        # the first piece along a ray may be a chariot; if it is not a cannon, the next piece may be a cannon. The
+        # nearest pieces are usually a square or two away, so walking the ray beats masking the occupancy bitboard.
+        for ray in RAYS[square]:
+            screen_found = False
+            for a_square in ray:
+                code = cells[a_square]
+                if not code:
+                    continue
+                if not screen_found:
+                    if code == chariot:
+                        return True
+                    if code & 7 == CANNON or target_is_cannon:
+                        break
+                    screen_found = True
+                else:
+                    if code == cannon:
+                        return True
+                    break
+
+        occupied = self._occupied
+        for source, code, path_mask in ATTACK_TABLES[color][square]:
+            if cells[source] == code and not occupied & path_mask:
+                return True
+
+        return False
 
-            row = start_row
+    def attacked_squares(self, color):
+        """Takes a color and returns a 90-bit mask with bit n set for every square n that one of that player's pieces
+        could move to, capturing whatever stands there, as _is_attacked decides it. Squares holding that player's
+        own pieces are included, as they are defended. The mask is computed in one pass over the player's pieces
+        and kept until the position changes. SQUARE_NAMES gives the position of each bit"""
 
-            if end_row > start_row:
+        cached = self._attacks.get(color)
+        if cached is not None and cached[0] == self._hash:
+            return cached[1]
 
-                for num in range(start_column, end_column + 1):
-                    a_piece = reverse_key[num] + str(row)
-                    object_list.append(self.get_piece_from_position(a_piece))
-                    row += 1
+        mask = self._attack_mask(color, self._occupied)
+        self._attacks[color] = (self._hash, mask)
+        return mask
 
+    def _attack_mask(self, color, occupied):
+        """Takes a color and an occupancy bitboard and returns the mask of squares attacked by that player's pieces
+        when only the squares in the bitboard block lines and legs"""
 
-            elif end_row < start_row:
+        cells = self._cells
+        mask = 0
 
-                for num in range(start_column, end_column + 1):
-                    a_piece = reverse_key[num] + str(row)
-                    object_list.append(self.get_piece_from_position(a_piece))
-                    row -= 1
+        for a_piece in self._get_side(color)[0]:
+            square = a_piece.get_square()
+            if square is None:
+                continue
 
+            code = cells[square]
+            kind = code & 7
 
-        elif start_column > end_column:
+            # Chariot attacks along each ray up to and including the first piece
+            if kind == CHARIOT:
+                for ray, ray_mask, increasing, positions in RAY_MASKS[square]:
+                    blockers = occupied & ray_mask
+                    if not blockers:
+                        mask |= ray_mask
+                        continue
+                    if increasing:
+                        first_bit = blockers & -blockers
+                        mask |= ray_mask & ((first_bit << 1) - 1)
+                    else:
+                        first_bit = 1 << (blockers.bit_length() - 1)
+                        mask |= ray_mask & -first_bit
+
+            # Cannon attacks beyond a screen that is not a cannon, up to and including the next piece unless it is
+            # a cannon
+            elif kind == CANNON:
+                for ray, ray_mask, increasing, positions in RAY_MASKS[square]:
+                    blockers = occupied & ray_mask
+                    if not blockers:
+                        continue
 
-            row = end_row
+                    first_bit = blockers & -blockers if increasing else 1 << (blockers.bit_length() - 1)
+                    if cells[first_bit.bit_length() - 1] & 7 == CANNON:
+                        continue
 
-            if end_row > start_row:
+                    # squares of the ray beyond the screen
+                    beyond = ray_mask & -(first_bit << 1) if increasing else ray_mask & (first_bit - 1)
+                    blockers ^= first_bit
+                    if not blockers:
+                        mask |= beyond
+                        continue
 
-                for num in range(end_column, start_column + 1):
-                    a_piece = reverse_key[num] + str(row)
-                    object_list.append(self.get_piece_from_position(a_piece))
-                    row -= 1
+                    if increasing:
+                        second_bit = blockers & -blockers
+                        beyond &= (second_bit << 1) - 1
+                    else:
+                        second_bit = 1 << (blockers.bit_length() - 1)
+                        beyond &= -second_bit
+                    if cells[second_bit.bit_length() - 1] & 7 == CANNON:
+                        beyond ^= second_bit
+                    mask |= beyond
 
-                object_list.reverse()
+            # other pieces attack every destination whose path is clear
+            else:
+                for a_square, path_mask in CODE_PATH_MASKS[code][square].items():
+                    if not occupied & path_mask:
+                        mask |= SQUARE_BITS[a_square]
 
+        return mask
 
-            elif start_row > end_row:
+    def _get_side(self, color):
+        """Takes a color and returns that player's list of pieces and their general"""
 
-                for num in range(end_column, start_column + 1):
-                    a_piece = reverse_key[num] + str(row)
-                    object_list.append(self.get_piece_from_position(a_piece))
-                    row += 1
+        if color == 'red':
+            return self._red_pieces, self._red_general
+        return self._blue_pieces, self._blue_general
 
-                object_list.reverse()
+    def _move_piece(self, current_square, new_square):
+        """Takes as parameters a current square and a new square, moves the piece on the board and marks any piece
+        on the new square as captured. Returns the captured piece or None. Does not validate the move."""
 
-            else:
-                object_list.append(start_position)
+        board = self._game_board
+        piece = board[current_square]
+        captured_piece = board[new_square]
 
+        if captured_piece is not None:
+            captured_piece.set_square(None)
+        piece.set_square(new_square)
+        board[new_square] = piece
+        board[current_square] = None
 
-        final_object_list = []
+        cells = self._cells
+        cells[new_square] = cells[current_square]
+        cells[current_square] = 0
+        self._occupied = (self._occupied & ~SQUARE_BITS[current_square]) | SQUARE_BITS[new_square]
 
-        for an_object in object_list:
-            if an_object is not None:
-                final_object_list.append(an_object)
+        return captured_piece
 
-        return final_object_list
+    def _unmove_piece(self, current_square, new_square, captured_piece):
+        """Takes as parameters the squares and captured piece of a move made with _move_piece and reverses it"""
 
-    def is_valid_move(self,current_position,new_position):
-        """Takes as parameters a current position and new position and returns True or False depending on validity of move"""
+        board = self._game_board
+        piece = board[new_square]
 
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        reverse_key = {1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f', 7: 'g', 8: 'h', 9: 'i'}
-        new_column = key[new_position[0]]
-        new_row = int(new_position[1:])
-        current_column = key[current_position[0]]
-        current_row = int(current_position[1:])
+        if captured_piece is not None:
+            captured_piece.set_square(new_square)
+        piece.set_square(current_square)
+        board[new_square] = captured_piece
+        board[current_square] = piece
 
-        if self.get_piece_from_position(current_position) is not None:
-            piece = self.get_piece_from_position(current_position)
+        cells = self._cells
+        cells[current_square] = cells[new_square]
+        self._occupied |= SQUARE_BITS[current_square]
+        if captured_piece is not None:
+            cells[new_square] = captured_piece.get_code()
         else:
+            cells[new_square] = 0
+            self._occupied &= ~SQUARE_BITS[new_square]
+
+    def _invalidate_moves(self, current_square, new_square):
+        """Takes the two squares changed by a move or its retraction and drops the kept move lists of the pieces on
+        them and of every piece whose moves depend on either square. Only squares holding a list are examined, so
+        this costs nothing while no lists are kept"""
+
+        listed = self._listed
+        if not listed:
+            return
+
+        move_lists = self._move_lists
+        cells = self._cells
+        changed = SQUARE_BITS[current_square] | SQUARE_BITS[new_square]
+
+        # lists on the changed squares themselves are always dropped
+        dropped = listed & changed
+        candidates = listed & ~changed & (AFFECTED_BY[current_square] | AFFECTED_BY[new_square])
+        while candidates:
+            lowest = candidates & -candidates
+            square = lowest.bit_length() - 1
+            if DEPENDENCY_MASKS[cells[square]][square] & changed:
+                dropped |= lowest
+            candidates ^= lowest
+
+        if dropped:
+            self._listed = listed ^ dropped
+            while dropped:
+                lowest = dropped & -dropped
+                move_lists[lowest.bit_length() - 1] = None
+                dropped ^= lowest
+
+    def _generals_facing(self):
+        """Takes no parameters and returns True if the two generals stand on the same file with no piece between
+        them (bikjang)"""
+
+        red_square = self._red_general.get_square()
+        blue_square = self._blue_general.get_square()
+
+        if red_square % 9 != blue_square % 9:
             return False
 
-        if self.get_piece_from_position(new_position) is not None:
-            if piece.get_color() == self.get_piece_from_position(new_position).get_color():
-                return False
+        low, high = min(red_square, blue_square), max(red_square, blue_square)
+        between = FILE_MASKS[low % 9] & (SQUARE_BITS[high] - (SQUARE_BITS[low] << 1))
+        return not self._occupied & between
 
-        if (new_column,new_row) not in piece.possible_moves():
-            return False
+    def set_draw_rules(self, enabled=True, max_plies=MAX_PLIES):
+        """Takes whether threefold repetition and bikjang end the game as a draw, and the number of plies from the
+        start of the game after which it is drawn, or None for no limit"""
 
-        # Ensures that chariot does not jump over pieces
-        if piece.get_name() == 'Chariot':
-            row_objects = self.get_objects_in_row(current_position,new_position)
-            column_objects = self.get_objects_in_column(current_position,new_position)
-            diagonal_objects = self.get_objects_in_diagonal(current_position,new_position)
+        self._draw_rules = enabled
+        self._max_plies = max_plies
 
-            if current_row == new_row and (len(row_objects) == 1 or (len(row_objects) == 2 and row_objects[1] == self.get_piece_from_position(new_position))):
-                return True
-            if current_column == new_column and (len(column_objects) == 1 or (len(column_objects) == 2 and column_objects[1] == self.get_piece_from_position(new_position))):
-                return True
-            if current_row != new_row and current_column != new_column and (len(diagonal_objects) == 1 or (len(diagonal_objects) == 2 and diagonal_objects[1] == self.get_piece_from_position(new_position))):
-                return True
+    def draw_state(self):
+        """Takes no parameters and returns what the draw rules know of the moves before the current position, to be
+        sent along with compact_state: whether the game is drawn, the plies played, the (position hash, count) pairs
+        of the positions reached since the last capture, whether the draw rules are on and the move limit"""
 
-            return False
+        return (self._game_state == "DRAW", self._start_ply + len(self._history), tuple(self._hash_counts.items()),
+                self._draw_rules, self._max_plies)
 
-        # Ensures that cannon has exactly one piece to jump over, is not jumping over a cannon and is not capturing another cannon
-        if piece.get_name() == 'Cannon':
-            row_objects = self.get_objects_in_row(current_position, new_position)
-            column_objects = self.get_objects_in_column(current_position, new_position)
-            diagonal_objects = self.get_objects_in_diagonal(current_position, new_position)
-
-            if current_row == new_row and len(row_objects) == 3:
-                if row_objects[1].get_name() != 'Cannon' and row_objects[2].get_name() != 'Cannon':
-                    return True
-            if current_column == new_column and len(column_objects) == 3:
-                if column_objects[1].get_name() != 'Cannon' and column_objects[2].get_name() != 'Cannon':
-                    return True
-            if current_row != new_row and current_column != new_column and diagonal_objects == 3:
-                if diagonal_objects[1].get_name() != 'Cannon' and diagonal_objects[2].get_name() != 'Cannon':
-                    return True
-
-
-            if current_row == new_row and len(row_objects) == 2:
-                if self.get_piece_from_position(new_position) is None and row_objects[1].get_name() != 'Cannon':
-                    return True
-            if current_column == new_column and len(column_objects) == 2:
-                if self.get_piece_from_position(new_position) is None and column_objects[1].get_name() != 'Cannon':
-                    return True
-            if current_row != new_row and current_column != new_column and diagonal_objects == 2:
-                if self.get_piece_from_position(new_position) is None and diagonal_objects[1].get_name() != 'Cannon':
-                    return True
+    def set_draw_state(self, state):
+        """Takes a tuple returned by draw_state for this position, as in a game just made by from_compact_state,
+        and carries it over, so that repetitions and the move limit count the moves made before the position"""
 
-            return False
+        drawn, plies, counts, enabled, max_plies = state
 
-        # Ensures that horse is not jumping over pieces
-        if piece.get_name() == "Horse":
-
-            if current_row > new_row and abs(current_column-new_column) == 1:
-                check_position = reverse_key[current_column]+str(current_row-1)
-                if self.get_piece_from_position(check_position) is None:
-                    return True
-            if current_row < new_row and abs(current_column-new_column) == 1:
-                check_position = reverse_key[current_column] + str(current_row + 1)
-                if self.get_piece_from_position(check_position) is None:
-                    return True
-            if current_column > new_column and abs(current_row-new_row) == 1:
-                check_position = reverse_key[current_column-1] + str(current_row)
-                if self.get_piece_from_position(check_position) is None:
-                    return True
-            if current_column < new_column and abs(current_row-new_row) == 1:
-                check_position = reverse_key[current_column+1] + str(current_row)
-                if self.get_piece_from_position(check_position) is None:
-                    return True
+        self.set_draw_rules(enabled, max_plies)
+        self._start_ply = plies - len(self._history)
+        self._hash_counts = dict(counts)
 
-            return False
+        # the current position is counted again by _count_positions when a capture is retracted back to it
+        self._prior_counts = dict(counts)
+        if self._prior_counts.get(self._hash, 0) > 1:
+            self._prior_counts[self._hash] -= 1
+        else:
+            self._prior_counts.pop(self._hash, None)
+
+        if drawn and self._game_state == "UNFINISHED":
+            self._game_state = "DRAW"
+
+    def _gives_check(self, color):
+        """Takes the color of the player who just moved and returns True if the opposing general is in check"""
+
+        return self._is_attacked(self._get_side('blue' if color == 'red' else 'red')[1].get_square(), color)
+
+    def _is_self_check(self, current_square, new_square):
+        """Takes as parameters the current square and new square of a valid move and returns True if the move would
+        place the mover's general in check. The move is made on the board, tested and reversed before returning."""
+
+        color = self._game_board[current_square].get_color()
+        general = self._get_side(color)[1]
+
+        captured_piece = self._move_piece(current_square, new_square)
+        in_check = self._is_attacked(general.get_square(), 'blue' if color == 'red' else 'red')
+        self._unmove_piece(current_square, new_square, captured_piece)
+
+        return in_check
+
+    def _pseudo_legal_moves(self, color):
+        """Takes a color and yields (current square, new square) for every valid move of that player's pieces,
+        without testing whether the move leaves their own general in check. Each piece's moves are kept between
+        calls and only regenerated after a move changes a square they depend on. Moves are yielded as they are
+        consumed, so a caller looking for any one move can stop early"""
+
+        move_lists = self._move_lists
+
+        for a_piece in self._get_side(color)[0]:
+            square = a_piece.get_square()
+            if square is None:
+                continue
+
+            moves = move_lists[square]
+            if moves is None:
+                moves = move_lists[square] = self._piece_moves(square)
+                self._listed |= SQUARE_BITS[square]
+            yield from moves
+
+    def _piece_moves(self, square):
+        """Takes an occupied square and returns a list of (current square, new square) for every valid move of the
+        piece on it, without testing whether the move leaves its own general in check"""
+
+        cells = self._cells
+        occupied = self._occupied
+        moves = []
+
+        code = cells[square]
+        kind = code & 7
+        side = code & BLUE
+
+        # Chariot slides along each ray until the first piece, which it can capture if it is an opponent's
+        if kind == CHARIOT:
+            for ray, ray_mask, increasing, positions in RAY_MASKS[square]:
+                blockers = occupied & ray_mask
+                if not blockers:
+                    for a_square in ray:
+                        moves.append((square, a_square))
+                    continue
+
+                first = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+                for a_square in ray[:positions[first]]:
+                    moves.append((square, a_square))
+                if cells[first] & BLUE != side:
+                    moves.append((square, first))
+
+        # Cannon jumps the first piece along each ray unless it is a cannon, then moves until the next piece,
+        # which it can capture if it is an opponent's piece other than a cannon
+        elif kind == CANNON:
+            for ray, ray_mask, increasing, positions in RAY_MASKS[square]:
+                blockers = occupied & ray_mask
+                if not blockers:
+                    continue
+
+                first = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+                if cells[first] & 7 == CANNON:
+                    continue
+
+                blockers ^= SQUARE_BITS[first]
+                if not blockers:
+                    for a_square in ray[positions[first] + 1:]:
+                        moves.append((square, a_square))
+                    continue
+
+                second = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+                for a_square in ray[positions[first] + 1:positions[second]]:
+                    moves.append((square, a_square))
+                target = cells[second]
+                if target & BLUE != side and target & 7 != CANNON:
+                    moves.append((square, second))
+
+        # other pieces need an empty path, which is only the horse and elephant legs
+        else:
+            for a_square, path_mask in CODE_PATH_MASKS[code][square].items():
+                target = cells[a_square]
+                if target and target & BLUE == side:
+                    continue
+                if not occupied & path_mask:
+                    moves.append((square, a_square))
 
-        #Ensures that elephant is not jumping over pieces
-        if piece.get_name() == 'Elephant':
-            if current_row > new_row and current_column > new_column:
-                diagonal_position_1 = reverse_key[new_column+1]+str(new_row+1)
-                diagonal_position_2 = reverse_key[new_column+2]+str(new_row+2)
-                check_objects = self.get_objects_in_diagonal(diagonal_position_1,diagonal_position_2)
-                if len(check_objects) == 0:
-                    return True
-
-            if current_row > new_row and current_column < new_column:
-                diagonal_position_1 = reverse_key[new_column - 1] + str(new_row + 1)
-                diagonal_position_2 = reverse_key[new_column - 2] + str(new_row + 2)
-                check_objects = self.get_objects_in_diagonal(diagonal_position_1, diagonal_position_2)
-                if len(check_objects) == 0:
-                    return True
-
-            if current_row < new_row and current_column > new_column:
-                diagonal_position_1 = reverse_key[new_column + 1] + str(new_row - 1)
-                diagonal_position_2 = reverse_key[new_column + 2] + str(new_row - 2)
-                check_objects = self.get_objects_in_diagonal(diagonal_position_1, diagonal_position_2)
-                if len(check_objects) == 0:
-                    return True
-
-
-            if current_row < new_row and current_column < new_column:
-                diagonal_position_1 = reverse_key[new_column - 1] + str(new_row - 1)
-                diagonal_position_2 = reverse_key[new_column - 2] + str(new_row - 2)
-                check_objects = self.get_objects_in_diagonal(diagonal_position_1, diagonal_position_2)
-                if len(check_objects) == 0:
-                    return True
+        return moves
 
-            return False
+    def _legal_moves(self, color):
+        """Takes a color and returns a list of (current square, new square) for every legal move of that player,
+        including passing, which is listed as the general's square to itself"""
 
-        # returns True for General or Soldier since no further restrictions of movement
-        if piece.get_name() == "General" or piece.get_name() == "Soldier":
-            return True
+        if self._game_state != "UNFINISHED":
+            return []
+
+        move_list = [move for move in self._pseudo_legal_moves(color) if not self._is_self_check(*move)]
+
+        if self._is_in_check != color:
+            general_square = self._get_side(color)[1].get_square()
+            move_list.append((general_square, general_square))
+
+        return move_list
+
+    def legal_moves(self, color=None):
+        """Takes as an optional parameter a color, defaulting to the player whose turn it is, and returns a list of
+        (current position, new position) pairs for every legal move, each of which can be passed to make_move. Passing
+        is included as the general's position to itself when the player is not in check"""
+
+        if color is None:
+            color = 'red' if self._players_turn == 'red' else 'blue'
 
+        return [(SQUARE_NAMES[current_square], SQUARE_NAMES[new_square])
+                for current_square, new_square in self._legal_moves(color)]
+
+    def book_moves(self, book):
+        """Takes as a parameter an opening book, such as JanggiBook.OpeningBook, and returns a list of
+        ((current position, new position), weight) for every book move from the current position, heaviest first.
+        Entries that are not legal here, which can only come from a hash collision, are left out"""
+
+        if self._game_state != "UNFINISHED":
+            return []
+
+        color = 'red' if self._players_turn == 'red' else 'blue'
+        side = BLUE if color == 'blue' else 0
+        moves = []
+
+        for current_square, new_square, weight in book.probe(self._hash):
+            code = self._cells[current_square]
+            if not code or code & BLUE != side:
+                continue
+            if not self._is_valid_move(current_square, new_square) or self._is_self_check(current_square, new_square):
+                continue
+            moves.append(((SQUARE_NAMES[current_square], SQUARE_NAMES[new_square]), weight))
+
+        moves.sort(key=lambda move: -move[1])
+        return moves
+
+    def _staged_moves(self, color, hash_move=None, killers=(), captures_only=False):
+        """Takes a color, optionally a hash move and killer moves to try early and whether to stop after captures,
+        and yields (current square, new square) for the legal moves of that player in stages: the hash move, then
+        captures by most valuable victim and least valuable attacker, then the killer moves, then the remaining
+        moves, then passing. Each move is only tested for leaving the general in check when it is reached, so a
+        caller that stops early, as after a cutoff, skips testing the rest. The board may be changed between moves
+        as long as it is restored before the next one is asked for"""
+
+        if self._game_state != "UNFINISHED":
+            return
+
+        cells = self._cells
+        side = BLUE if color == 'blue' else 0
+        general_square = self._get_side(color)[1].get_square()
+        can_pass = self._is_in_check != color
+
+        if hash_move is not None and not captures_only:
+            current_square, new_square = hash_move
+            if current_square == new_square:
+                if current_square == general_square and can_pass:
+                    yield hash_move
+            elif (cells[current_square] and cells[current_square] & BLUE == side
+                  and self._is_valid_move(current_square, new_square)
+                  and not self._is_self_check(current_square, new_square)):
+                yield hash_move
+
+        captures = []
+        quiet_moves = []
+        for move in self._pseudo_legal_moves(color):
+            if cells[move[1]]:
+                captures.append(move)
+            elif not captures_only:
+                quiet_moves.append(move)
+
+        # different victim values are at least 100 apart, and 16 times that is more than any attacker is worth, so
+        # the victim decides and the attacker breaks ties
+        captures.sort(key=lambda move: KIND_VALUES[cells[move[0]] & 7] - 16 * KIND_VALUES[cells[move[1]] & 7])
+
+        for move in captures:
+            if move != hash_move and not self._is_self_check(*move):
+                yield move
+
+        if captures_only:
+            return
+
+        early_moves = [move for move in killers if move is not None and move != hash_move and move in quiet_moves]
+        for move in early_moves:
+            if not self._is_self_check(*move):
+                yield move
+
+        for move in quiet_moves:
+            if move != hash_move and move not in early_moves and not self._is_self_check(*move):
+                yield move
+
+        if can_pass and hash_move != (general_square, general_square):
+            yield (general_square, general_square)
+
+    def iter_moves(self, color=None):
+        """Takes as an optional parameter a color, defaulting to the player whose turn it is, and yields the same
+        (current position, new position) pairs as legal_moves, captures of the most valuable pieces first, testing
+        each move only when it is reached"""
+
+        if color is None:
+            color = 'red' if self._players_turn == 'red' else 'blue'
+
+        for current_square, new_square in self._staged_moves(color):
+            yield SQUARE_NAMES[current_square], SQUARE_NAMES[new_square]
+
+    def _has_legal_move(self, color):
+        """Takes a color and returns True as soon as one legal move other than passing is found for that player"""
+
+        for move in self._pseudo_legal_moves(color):
+            if not self._is_self_check(*move):
+                return True
+        return False
+
+    def is_checkmate(self, color):
+        """Takes as a parameter a color and returns True if that player is in check and has no legal move that gets
+        them out of it, whether by moving the general, capturing the checking piece or blocking its line or jump"""
+
+        general_square = self._get_side(color)[1].get_square()
+
+        if not self._is_attacked(general_square, 'blue' if color == 'red' else 'red'):
+            return False
+
+        return not self._has_legal_move(color)
 
     def make_move(self, current_position, new_position):
         """Takes as parameters a current position and a new position, makes a move if valid, checks if a player is in check or checkmated,
-        and updates player's turn and game state
+        and updates player's turn and game state. The move is recorded so that it can be retracted with pop.
         """
-        key = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9}
-        reverse_key = {1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f', 7: 'g', 8: 'h', 9: 'i'}
-        new_column = key[new_position[0]]
-        new_row = int(new_position[1:])
-        current_column = key[current_position[0]]
-        current_row = int(current_position[1:])
 
         # ends game if game has been won
         if self._game_state != "UNFINISHED":
             return False
 
+        players_turn = 'red' if self._players_turn == 'red' else 'blue'
+
         # allows a player to pass if player is not in check
         if current_position == new_position:
 
-            if self._is_in_check == 'blue' and self._players_turn == 'blue':
-                    return False
-            elif self._is_in_check == 'red' and self._players_turn == 'red':
-                    return False
-            else:
-                if self._players_turn == 'blue':
-                    self._players_turn = 'red'
-                elif self._players_turn == 'red':
-                    self._players_turn = 'blue'
-                return True
+            if self._is_in_check == players_turn:
+                return False
+
+            general_square = self._get_side(players_turn)[1].get_square()
+            self._push(general_square, general_square)
+            return True
+
+        # ensures that position is within game board
+        current_square = SQUARE_INDEX.get(current_position)
+        new_square = SQUARE_INDEX.get(new_position)
+
+        if current_square is None or new_square is None:
+            return False
 
         # picks up a piece only if there is a piece present
-        if self.get_piece_from_position(current_position) is not None:
-            piece = self.get_piece_from_position(current_position)
-        else:
+        piece = self._game_board[current_square]
+        if piece is None:
             return False
 
-        # ensures that blue is first player to go
-        if self._players_turn == 'tbd' and piece.get_color() == 'red':
+        # ensures that it is correct player's turn to go. Blue is first player to go.
+        if piece.get_color() != players_turn:
             return False
-        elif self._players_turn == 'tbd' and piece.get_color() == 'blue':
-            self._players_turn = 'blue'
 
-        # ensures that it is correct player's turn to go
-        if piece.get_color() != self._players_turn:
-            if self._players_turn == "tbd":
-                pass
-            else:
-                return False
+        # ensures that move is ultimately valid and that player does not place themselves in check, reusing an
+        # earlier result for the same position and move if there is one
+        cache = self._validation_cache
+        key = (self._hash, current_square, new_square)
+        legal = cache.get(key) if cache is not None else None
 
-        # ensures that position is within game board
-        if new_row not in range(1, 11) or new_column not in range(1, 10):
+        if legal is None:
+            legal = self._is_valid_move(current_square, new_square) and not self._is_self_check(current_square,
+                                                                                                 new_square)
+            if cache is not None:
+                cache.put(key, legal)
+
+        if not legal:
             return False
 
+        self._push(current_square, new_square)
+        return True
 
-        # ensures that move is ultimately valid
-        if self.is_valid_move(current_position,new_position) is False:
-            return False
+    def push(self, move):
+        """Takes as a parameter a move as a (current position, new position) pair, such as one returned by
+        legal_moves, and makes it as make_move does. Returns True if the move was made, otherwise False"""
 
-        # save captured piece in case player places themselves in check and need to reverse the move
-        saved_captured_piece = self.get_piece_from_position(new_position)
-        # change piece's listed position
-        piece.set_position(new_position)
-
-        #  If a piece is captured, change its listed position to captured
-        if self.get_piece_from_position(new_position) is not None:
-           captured_piece = self.get_piece_from_position(new_position)
-           captured_piece.set_position("captured")
-
-           ### List of captured pieces
-           if captured_piece.get_color() == "blue":
-               self._captured_list_blue.append(captured_piece)
-           elif  captured_piece.get_color() == "red":
-               self._captured_list_red.append(captured_piece)
-
-        # update board to reflect new positions
-        self._game_board[new_column][new_row] = piece
-        self._game_board[current_column][current_row] = None
-
-
-        if self.get_players_turn() == 'blue':
-            # reverse move if player places themselves in check and return False
-            for a_red_piece in self._red_pieces:
-                if a_red_piece.get_position() != 'captured':
-                    if self.is_valid_move(a_red_piece.get_position(),self._blue_general.get_position()) is True:
-                        if saved_captured_piece is not None:
-                            saved_captured_piece.set_position(new_position)
-                        piece.set_position(current_position)
-                        self._game_board[new_column][new_row] = saved_captured_piece
-                        self._game_board[current_column][current_row] = piece
-                        return False
-                    else:
-                        continue
+        current_position, new_position = move
+        return self.make_move(current_position, new_position)
 
-            # if player was in check, then take them out of check
-            self._is_in_check = ""
+    def pop(self):
+        """Takes no parameters, retracts the last move made and returns it as a (current position, new position)
+        pair, restoring captured pieces, turn, check and game state. Returns None if there is no move to retract"""
 
-            # if opposite player is in check after move, then update is_in_check
-            for a_blue_piece in self._blue_pieces:
-                if a_blue_piece.get_position() != "captured":
-                    if self.is_valid_move(a_blue_piece.get_position(),self._red_general.get_position()) is True:
-                        self._is_in_check = 'red'
-                        break
-                    else:
-                        continue
+        if not self._history:
+            return None
 
-            # if opposite player is in check, determine if they are in checkmate
-            if self._is_in_check == 'red':
-
-                red_can_capture_piece = False
-                # if opposite player can capture piece that placed them in check, then opposite player can
-                # get out of check in next move. Set red_can_capture_piece to True.
-                for a_red_piece in self._red_pieces:
-                    if a_red_piece.get_position() != "captured":
-                        if self.is_valid_move(a_red_piece.get_position(),piece.get_position()) is True:
-                            red_can_capture_piece = True
-                            break
-
-                general_column = key[self._red_general.get_position()[0]]
-                general_row = int(self._red_general.get_position()[1:])
-                piece_column = key[piece.get_position()[0]]
-                piece_row = int(self._red_general.get_position()[1:])
-                red_can_block_piece = False
-
-
-
-                # Check to see if special pieces can be blocked to prevent a check
-                if piece.get_name() == 'Horse':
-                    if general_row > piece_row and abs(piece_column - general_column) == 1:
-                        check_position = reverse_key[piece_column] + str(general_row - 1)
-                    if general_row < piece_row and abs(piece_column - general_column) == 1:
-                        check_position = reverse_key[piece_column] + str(piece_row + 1)
-                    if piece_column > general_column and abs(piece_row - general_row) == 1:
-                        check_position = reverse_key[piece_column - 1] + str(piece_row)
-                    if piece_column < general_column and abs(piece_row - general_row) == 1:
-                        check_position = reverse_key[piece_column + 1] + str(piece_row)
-
-                    for a_red_piece in self._red_pieces:
-                        if a_red_piece.get_position() != 'captured' and a_red_piece.get_name() != 'General':
-                            if self.is_valid_move(a_red_piece.get_position(), check_position) is True:
-                                red_can_block_piece = True
-                                break
-                            else:
-                                continue
-
-                if piece.get_name() == 'Elephant':
-                    if piece_row > general_row and piece_column > general_column:
-                        diagonal_position_1 = reverse_key[general_column + 1] + str(general_row + 1)
-                        diagonal_position_2 = reverse_key[general_column + 2] + str(general_row + 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-
-                    if piece_row > general_row and piece_column < general_column:
-                        diagonal_position_1 = reverse_key[general_column - 1] + str(general_row + 1)
-                        diagonal_position_2 = reverse_key[general_column - 2] + str(general_row + 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-                    if piece_row < general_row and piece_column > general_column:
-                        diagonal_position_1 = reverse_key[general_column + 1] + str(general_row - 1)
-                        diagonal_position_2 = reverse_key[general_column + 2] + str(general_row - 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-                    if piece_row < general_row and piece_column < general_column:
-                        diagonal_position_1 = reverse_key[general_column - 1] + str(general_row - 1)
-                        diagonal_position_2 = reverse_key[general_column - 2] + str(general_row - 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-
-                    for a_position in check_positions:
-
-                        for a_red_piece in self._red_pieces:
-                            if a_red_piece.get_position() != 'captured' and a_red_piece.get_name() != 'General':
-                                if self.is_valid_move(a_red_piece.get_position(),a_position) is True:
-                                    red_can_block_piece = True
-                                    break
-
-                        if red_can_block_piece is True:
-                            break
-
-
-                a_red_fortress_position = ['d1','e1','f1','d2','e2','f2','d3','e3','f3']
-                valid_moves = set()
-
-                # Determine valid positions for general and place them in a set named valid_moves
-                for a_position in a_red_fortress_position:
-                    if self.is_valid_move(self._red_general.get_position(),a_position) is True:
-                        valid_moves.add(a_position)
-
-                valid_moves.add(self._red_general.get_position())
-                saved_red_general_position = self._red_general.get_position()
-                red_in_check_position = set()
-
-                # For a general's valid moves, move the general to that position and see if opposite player's pieces
-                # can capture the general. If they can, then place that position in a set named red_in_check_position.
-                for a_position in valid_moves:
-
-                    if saved_red_general_position != a_position:
-                        self._red_general.set_position(a_position)
-                        saved_piece = self.get_piece_from_position(a_position)
-                        if saved_piece is not None:
-                            saved_piece.set_position("captured")
-
-                        self._game_board[key[a_position[0]]][int(a_position[1:])] = self._red_general
-                        self._game_board[key[saved_red_general_position[0]]][int(saved_red_general_position[1:])] = None
-
-                    for a_blue_piece in self._blue_pieces:
-                        if a_blue_piece.get_position() != "captured":
-                            if self.is_valid_move(a_blue_piece.get_position(),self._red_general.get_position()) is True:
-                                red_in_check_position.add(self._red_general.get_position())
-
-                    if saved_red_general_position != a_position:
-                        self._red_general.set_position(saved_red_general_position)
-
-                        if saved_piece is not None:
-                            saved_piece.set_position(a_position)
-
-                        self._game_board[key[saved_red_general_position[0]]][int(saved_red_general_position[1:])] = self._red_general
-                        self._game_board[key[a_position[0]]][int(a_position[1:])] = saved_piece
-
-                #If the set valid_moves is a subset of red_in_check_in_position, then
-                # red will be in check for all of its valid moves, and red_general_cannot_move is True.
-                red_general_cannot_move = valid_moves.issubset(red_in_check_position)
-                # If below conditions are true, then blue player has won. Update game state.
-                if red_general_cannot_move is True and red_can_capture_piece is False and red_can_block_piece is False:
-                    self._game_state = "BLUE_WON"
-
-
-        elif self.get_players_turn() == 'red':
-            # reverse move if player places themselves in check and return False
-            for a_blue_piece in self._blue_pieces:
-                if a_blue_piece.get_position() != 'captured':
-                    if self.is_valid_move(a_blue_piece.get_position(), self._red_general.get_position()) is True:
-
-                        if saved_captured_piece is not None:
-                            saved_captured_piece.set_position(new_position)
-                        piece.set_position(current_position)
-                        self._game_board[new_column][new_row] = saved_captured_piece
-                        self._game_board[current_column][current_row] = piece
-                        return False
-                    else:
-                        continue
+        current_square, new_square = self._pop()
+        return SQUARE_NAMES[current_square], SQUARE_NAMES[new_square]
+
+    def _push(self, current_square, new_square):
+        """Takes as parameters the current square and new square of a legal move, or the general's square twice for a
+        pass, and makes it. Updates captured pieces, check, game state and turn, and saves an undo record"""
+
+        board = self._game_board
+        piece = board[current_square]
+        color = piece.get_color()
+
+        # bikjang stands if the generals faced each other before this move and still do after it
+        was_facing = self._draw_rules and self._generals_facing()
+
+        # undo record: move, captured piece, previous turn, check state, game state and position hash
+        captured_piece = board[new_square] if current_square != new_square else None
+        self._history.append((current_square, new_square, captured_piece,
+                              self._players_turn, self._is_in_check, self._game_state, self._hash))
+
+        if current_square != new_square:
+            self._move_piece(current_square, new_square)
+            self._invalidate_moves(current_square, new_square)
+
+            piece_keys = ZOBRIST_PIECE_KEYS[self._cells[new_square]]
+            self._hash ^= piece_keys[current_square] ^ piece_keys[new_square]
+            if captured_piece is not None:
+                self._hash ^= ZOBRIST_PIECE_KEYS[captured_piece.get_code()][new_square]
 
-            # if player was in check, take them out of check
+            ### List of captured pieces
+            if captured_piece is not None:
+                if captured_piece.get_color() == "blue":
+                    self._captured_list_blue.append(captured_piece)
+                else:
+                    self._captured_list_red.append(captured_piece)
+                self._hash_counts = {}
+
+            opposing_color = 'red' if color == 'blue' else 'blue'
+
+            # if player was in check, then take them out of check
             self._is_in_check = ""
 
             # if opposite player is in check after move, then update is_in_check
-            for a_red_piece in self._red_pieces:
-                if a_red_piece.get_position() != "captured":
-                    if self.is_valid_move(a_red_piece.get_position(), self._blue_general.get_position()) is True:
-                        self._is_in_check = 'blue'
-                        break
-                    else:
-                        continue
+            if self._gives_check(color):
+                self._is_in_check = opposing_color
 
-            # if opposite player is in check, determine if they are in checkmate
-            if self._is_in_check == 'blue':
-
-                blue_can_capture_piece = False
-                # if opposite player can capture piece that placed them in check, then opposite player can
-                # get out of check in next move. Set blue_can_capture_piece to True.
-                for a_blue_piece in self._red_pieces:
-                    if a_blue_piece.get_position() != "captured":
-                        if self.is_valid_move(a_blue_piece.get_position(), piece.get_position()) is True:
-                            blue_can_capture_piece = True
-                            break
-
-                general_column = key[self._blue_general.get_position()[0]]
-                general_row = int(self._blue_general.get_position()[1:])
-                piece_column = key[piece.get_position()[0]]
-                piece_row = int(self._blue_general.get_position()[1:])
-                blue_can_block_piece = False
-
-
-                # Check to see if special pieces can be blocked to prevent a check
-                if piece.get_name() == 'Horse':
-                    if general_row > piece_row and abs(piece_column - general_column) == 1:
-                        check_position = reverse_key[piece_column] + str(general_row - 1)
-                    if piece_row < general_row and abs(piece_column - general_column) == 1:
-                        check_position = reverse_key[piece_column] + str(piece_row + 1)
-                    if piece_column > general_column and abs(piece_row - general_row) == 1:
-                        check_position = reverse_key[piece_column - 1] + str(piece_row)
-                    if piece_column < general_column and abs(piece_row - general_row) == 1:
-                        check_position = reverse_key[piece_column + 1] + str(piece_row)
-
-                    for a_blue_piece in self._blue_pieces:
-                        if a_blue_piece.get_position() != 'captured' and a_blue_piece.get_name() != 'General':
-                            if self.is_valid_move(a_blue_piece.get_position(), check_position) is True:
-                                blue_can_block_piece = True
-                                break
-                            else:
-                                continue
-
-                if piece.get_name() == 'Elephant':
-                    if piece_row > general_row and piece_column > general_column:
-                        diagonal_position_1 = reverse_key[general_column + 1] + str(general_row + 1)
-                        diagonal_position_2 = reverse_key[general_column + 2] + str(general_row + 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-
-                    if piece_row > general_row and piece_column < general_column:
-                        diagonal_position_1 = reverse_key[general_column - 1] + str(general_row + 1)
-                        diagonal_position_2 = reverse_key[general_column - 2] + str(general_row + 2)
-                        check_objects = [diagonal_position_1, diagonal_position_2]
-
-                    if piece_row < general_row and piece_column > general_column:
-                        diagonal_position_1 = reverse_key[general_column + 1] + str(general_row - 1)
-                        diagonal_position_2 = reverse_key[general_column + 2] + str(general_row - 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-                    if piece_row < general_row and piece_column < general_column:
-                        diagonal_position_1 = reverse_key[general_column - 1] + str(general_row - 1)
-                        diagonal_position_2 = reverse_key[general_column - 2] + str(general_row - 2)
-                        check_positions = [diagonal_position_1, diagonal_position_2]
-
-                    for a_position in check_positions:
-
-                        for a_blue_piece in self._blue_pieces:
-                            if a_blue_piece.get_position() != 'captured' and a_blue_piece.get_name() != 'General':
-                                if self.is_valid_move(a_blue_piece.get_position(),a_position) is True:
-                                    blue_can_block_piece = True
-                                    break
-
-                        if blue_can_block_piece is True:
-                            break
-
-                a_blue_fortress_position = ['d8', 'e8', 'f8', 'd9', 'e9', 'f9', 'd10', 'e10', 'f10']
-                valid_moves = set()
-
-                # Determine valid positions for general and place them in a set named valid_moves
-                for a_position in a_blue_fortress_position:
-                    if self.is_valid_move(self._blue_general.get_position(), a_position) is True:
-                        valid_moves.add(a_position)
-
-                valid_moves.add(self._blue_general.get_position())
-                saved_blue_general_position = self._blue_general.get_position()
-                blue_in_check_position = set()
-
-                # For a general's valid moves, move the general to that position and see if opposite player's pieces
-                # can capture the general. If they can, then place that position in a set named blue_in_check_position.
-                for a_position in valid_moves:
-
-                    if saved_blue_general_position != a_position:
-
-                        self._blue_general.set_position(a_position)
-                        saved_piece = self.get_piece_from_position(a_position)
-                        if saved_piece is not None:
-                            saved_piece.set_position("captured")
-
-                        self._game_board[key[a_position[0]]][int(a_position[1:])] = self._blue_general
-                        self._game_board[key[saved_blue_general_position[0]]][int(saved_blue_general_position[1:])] = None
-
-                    for a_red_piece in self._red_pieces:
-                        if a_red_piece.get_position() != "captured":
-                            if self.is_valid_move(a_red_piece.get_position(), self._blue_general.get_position()) is True:
-                                blue_in_check_position.add(self._blue_general.get_position())
-
-                    if saved_blue_general_position != a_position:
-
-                        self._blue_general.set_position(saved_blue_general_position)
-
-                        if saved_piece is not None:
-                            saved_piece.set_position(a_position)
-
-                        self._game_board[key[saved_blue_general_position[0]]][int(saved_blue_general_position[1:])] = self._blue_general
-                        self._game_board[key[a_position[0]]][int(a_position[1:])] = saved_piece
+                # if opposite player is in check, determine if they are in checkmate
+                if not self._has_legal_move(opposing_color):
+                    self._game_state = "BLUE_WON" if opposing_color == 'red' else "RED_WON"
 
-                #If the set valid_moves is a subset of blue_in_check_in_position, then
-                # blue will be in check for all of its valid moves. Set blue_general_cannot_move to True.
-                blue_general_cannot_move = valid_moves.issubset(blue_in_check_position)
-                # If below conditions are true, then blue player has won. Update game state.
-                if blue_general_cannot_move is True and blue_can_capture_piece is False and blue_can_block_piece is False:
-                    self._game_state = "RED_WON"
-
-
-        # If game is unfinished, then update player's turn and return True
+        # If game is unfinished, then update player's turn
         if self._game_state == 'UNFINISHED':
-            if self._players_turn == 'red':
-                self._players_turn = 'blue'
-            elif self._players_turn == 'blue':
-                self._players_turn = 'red'
+            self._players_turn = 'blue' if color == 'red' else 'red'
+            self._hash ^= ZOBRIST_RED_TO_MOVE
+
+            # the game is drawn on the third time a position is reached, when a player leaves the generals facing
+            # each other on an open file after the opponent brought them face to face (bikjang), or when the move
+            # limit is reached
+            count = self._hash_counts.get(self._hash, 0) + 1
+            self._hash_counts[self._hash] = count
+            if self._draw_rules and (count >= 3 or was_facing and self._generals_facing()):
+                self._game_state = "DRAW"
+            elif self._max_plies is not None and self._start_ply + len(self._history) >= self._max_plies:
+                self._game_state = "DRAW"
+
+    def _count_positions(self, position_hash):
+        """Takes the hash of the current position and returns the number of times each position has been reached
+        since the last capture in the history, or since the start if there was none"""
+
+        counts = {position_hash: 1}
+
+        for record in reversed(self._history):
+            if record[2] is not None:
+                return counts
+            counts[record[6]] = counts.get(record[6], 0) + 1
+
+        for prior_hash, count in self._prior_counts.items():
+            counts[prior_hash] = counts.get(prior_hash, 0) + count
+        return counts
+
+    def _pop(self):
+        """Takes no parameters, retracts the last move made with _push and returns its (current square, new square)"""
+
+        (current_square, new_square, captured_piece,
+         players_turn, is_in_check, game_state, position_hash) = self._history.pop()
+
+        # positions reached by the move were counted unless it was checkmate. The counts from before a capture
+        # were dropped, so retracting one counts them again from the history.
+        if captured_piece is not None:
+            self._hash_counts = self._count_positions(position_hash)
+        elif self._game_state == "UNFINISHED" or self._game_state == "DRAW":
+            count = self._hash_counts[self._hash] - 1
+            if count:
+                self._hash_counts[self._hash] = count
+            else:
+                del self._hash_counts[self._hash]
 
-        return True
+        if current_square != new_square:
+            self._unmove_piece(current_square, new_square, captured_piece)
+            self._invalidate_moves(current_square, new_square)
+
+            if captured_piece is not None:
+                if captured_piece.get_color() == "blue":
+                    self._captured_list_blue.pop()
+                else:
+                    self._captured_list_red.pop()
+
+        self._players_turn = players_turn
+        self._is_in_check = is_in_check
+        self._game_state = game_state
+        self._hash = position_hash
 
+        return current_square, new_square
@@ -0,0 +1,220 @@
+#: Description: Perft (performance test) for the Janggi rules engine. Counts the leaf nodes of the legal move tree to a
+#               given depth, which checks move generation against stored reference counts and measures its speed.
+#               Passing counts as a move. Run from the command line, for example: python JanggiPerft.py 3 --divide
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from JanggiGame import JanggiGame
+
+# positions used for reference counts, given as moves replayed from the standard setup
+REFERENCE_POSITIONS = {
+    'start': [],
+    'opening': [('e7', 'd7'), ('e2', 'd3'), ('d10', 'd9'), ('g4', 'g5')],
+    'midgame': [('e9', 'd9'), ('c1', 'd3'), ('f10', 'e10'), ('d3', 'e1'), ('d9', 'e9'), ('e2', 'f3'), ('h10', 'i8'),
+                ('i4', 'h4'), ('e7', 'e6'), ('b3', 'g3'), ('e9', 'f9'), ('h3', 'h6'), ('e10', 'f10'), ('h4', 'i4')],
+}
+
+# leaf node counts by depth for each reference position
+REFERENCE_COUNTS = {
+    'start': {1: 32, 2: 1024, 3: 33506, 4: 1095844},
+    'opening': {1: 30, 2: 1020, 3: 31575, 4: 1100822},
+    'midgame': {1: 29, 2: 1186, 3: 36435, 4: 1478535},
+}
+
+
+def game_from_moves(moves):
+    """
+    Takes a list of (from, to) positions and returns a JanggiGame with those moves played from the standard setup,
+    with the draw rules off as perft counts moves only. Raises ValueError if a move is rejected.
+    """
+    game = JanggiGame()
+    game.set_draw_rules(False, None)
+
+    for current_position, new_position in moves:
+        if game.make_move(current_position, new_position) is False:
+            raise ValueError("illegal move " + current_position + "-" + new_position)
+
+    return game
+
+
+def _side_to_move(game):
+    """
+    Takes a game and returns the color of the player to move.
+    """
+    return 'red' if game.get_players_turn() == 'red' else 'blue'
+
+
+def perft(game, depth):
+    """
+    Takes a game and a depth and returns the number of leaf nodes of the legal move tree at that depth. Moves are
+    made and retracted on the game itself, which is left as it was found.
+    """
+    if depth == 0:
+        return 1
+
+    moves = game._legal_moves(_side_to_move(game))
+
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for current_square, new_square in moves:
+        game._push(current_square, new_square)
+        nodes += perft(game, depth - 1)
+        game._pop()
+
+    return nodes
+
+
+def divide(game, depth):
+    """
+    Takes a game and a depth of at least 1 and returns a dict of each legal move to the number of leaf nodes below it.
+    """
+    counts = {}
+
+    for move in game.legal_moves():
+        game.push(move)
+        counts[move] = perft(game, depth - 1)
+        game.pop()
+
+    return counts
+
+
+def _perft_task(task):
+    """
+    Takes a (compact state, draw state, depth) tuple and returns the perft count of that position. Runs in a worker
+    process.
+    """
+    state, draw_state, depth = task
+    game = JanggiGame.from_compact_state(state)
+    game.set_draw_state(draw_state)
+    return perft(game, depth)
+
+
+def parallel_divide(game, depth, workers=None):
+    """
+    Takes a game, a depth of at least 1 and a number of worker processes, defaulting to one per CPU, and returns the
+    same dict as divide. Each root move's subtree is counted in a worker, which is sent the position after the move
+    as compact_state bytes rather than a pickled game, with its draw_state so that the draw rules apply as they
+    would to the game itself.
+    """
+    moves = game.legal_moves()
+    tasks = []
+
+    for move in moves:
+        game.push(move)
+        tasks.append((game.compact_state(), game.draw_state(), depth - 1))
+        game.pop()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(moves, executor.map(_perft_task, tasks)))
+
+
+def parallel_perft(game, depth, workers=None):
+    """
+    Takes a game, a depth and a number of worker processes, defaulting to one per CPU, and returns the same count as
+    perft, with the root moves split across the workers.
+    """
+    if depth <= 1:
+        return perft(game, depth)
+    return sum(parallel_divide(game, depth, workers).values())
+
+
+def run(game, max_depth, workers=None):
+    """
+    Takes a game, a maximum depth and optionally a number of worker processes to split the root moves across, and
+    returns a list of (depth, nodes, seconds) for every depth from 1.
+    """
+    results = []
+
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        nodes = perft(game, depth) if workers is None else parallel_perft(game, depth, workers)
+        results.append((depth, nodes, time.perf_counter() - start))
+
+    return results
+
+
+def check_reference(max_depth):
+    """
+    Takes a maximum depth and returns a list of (position name, depth, expected, found) for every reference count up
+    to that depth that the engine no longer reproduces.
+    """
+    failures = []
+
+    for name, moves in REFERENCE_POSITIONS.items():
+        game = game_from_moves(moves)
+        for depth, expected in sorted(REFERENCE_COUNTS[name].items()):
+            if depth > max_depth:
+                continue
+            found = perft(game, depth)
+            if found != expected:
+                failures.append((name, depth, expected, found))
+
+    return failures
+
+
+def _parse_moves(text):
+    """
+    Takes moves written as 'c7-c6,c4-c5' and returns a list of (from, to) positions.
+    """
+    if not text:
+        return []
+    return [tuple(move.split('-')) for move in text.split(',')]
+
+
+def main(argv=None):
+    """
+    Command line entry point. Prints nodes, time and nodes per second for each depth, or checks the reference table.
+    """
+    parser = argparse.ArgumentParser(description="Count Janggi legal move tree nodes to a given depth.")
+    parser.add_argument("depth", type=int, help="maximum depth to search")
+    parser.add_argument("--moves", default="", help="moves to play from the standard setup, e.g. c7-c6,c4-c5")
+    parser.add_argument("--position", choices=sorted(REFERENCE_POSITIONS), help="start from a reference position")
+    parser.add_argument("--fen", help="start from a FEN-style position instead of the standard setup")
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--check", action="store_true", help="compare against the stored reference counts")
+    parser.add_argument("--workers", type=int, default=None, help="split root moves across this many processes")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = check_reference(args.depth)
+        for name, depth, expected, found in failures:
+            print("%s depth %d: expected %d, found %d" % (name, depth, expected, found))
+        print("reference counts " + ("FAILED" if failures else "passed"))
+        return 1 if failures else 0
+
+    if args.fen:
+        game = JanggiGame.from_fen(args.fen)
+        game.set_draw_rules(False, None)
+        for current_position, new_position in _parse_moves(args.moves):
+            if game.make_move(current_position, new_position) is False:
+                raise ValueError("illegal move " + current_position + "-" + new_position)
+    else:
+        moves = REFERENCE_POSITIONS[args.position] if args.position else []
+        game = game_from_moves(moves + _parse_moves(args.moves))
+
+    if args.divide:
+        counts = divide(game, args.depth) if args.workers is None else parallel_divide(game, args.depth, args.workers)
+        for (current_position, new_position), nodes in sorted(counts.items()):
+            print("%s-%s: %d" % (current_position, new_position, nodes))
+        print("total: %d" % sum(counts.values()))
+        return 0
+
+    total_nodes = 0
+    total_seconds = 0.0
+    print("%5s %12s %10s %12s" % ("depth", "nodes", "seconds", "nodes/sec"))
+    for depth, nodes, seconds in run(game, args.depth, args.workers):
+        total_nodes += nodes
+        total_seconds += seconds
+        print("%5d %12d %10.3f %12.0f" % (depth, nodes, seconds, nodes / seconds if seconds else 0))
+    print("total %12d %10.3f %12.0f" % (total_nodes, total_seconds,
+                                        total_nodes / total_seconds if total_seconds else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#: Description: Binary game records for the Janggi rules engine. A record file starts with a 4 byte magic number and
+#               holds one game after another, each as a 3 byte header (result code and number of moves) followed by
+#               2 bytes per move giving the from and to square indexes. A pass is written as the general's square to
+#               itself. Games are written and read one at a time, so archives of millions of games never need to be
+#               held in memory. Run from the command line, for example: python JanggiRecord.py games.jgr --verify
+
+import argparse
+import struct
+import sys
+from collections import namedtuple
+
+from JanggiGame import SQUARE_INDEX, SQUARE_NAMES, JanggiGame
+
+MAGIC = b'JGR1'
+
+# result codes stored in each game header, one per get_game_state value
+RESULT_CODES = {'UNFINISHED': 0, 'RED_WON': 1, 'BLUE_WON': 2, 'DRAW': 3}
+RESULT_NAMES = {code: result for result, code in RESULT_CODES.items()}
+
+# result code and number of moves
+GAME_HEADER = struct.Struct('<BH')
+MAX_MOVES = 0xFFFF
+
+GameRecord = namedtuple('GameRecord', ['moves', 'result'])
+
+
+def encode_game(moves, result):
+    """
+    Takes a list of (from, to) positions played from the standard setup and a game state such as 'RED_WON', and
+    returns the game as record bytes. Raises ValueError for an unknown position or result, or too many moves.
+    """
+    if result not in RESULT_CODES:
+        raise ValueError("unknown result " + str(result))
+    if len(moves) > MAX_MOVES:
+        raise ValueError("a record holds at most %d moves" % MAX_MOVES)
+
+    data = bytearray(GAME_HEADER.pack(RESULT_CODES[result], len(moves)))
+
+    for current_position, new_position in moves:
+        current_square = SQUARE_INDEX.get(current_position)
+        new_square = SQUARE_INDEX.get(new_position)
+        if current_square is None or new_square is None:
+            raise ValueError("bad move " + str(current_position) + "-" + str(new_position))
+        data.append(current_square)
+        data.append(new_square)
+
+    return bytes(data)
+
+
+def record_of_game(game):
+    """
+    Takes a game played from the standard setup with make_move or push and returns its GameRecord, with the moves
+    taken from the game's history.
+    """
+    moves = [(SQUARE_NAMES[record[0]], SQUARE_NAMES[record[1]]) for record in game._history]
+    return GameRecord(moves, game.get_game_state())
+
+
+def replay(moves):
+    """
+    Takes a list of (from, to) positions and returns a JanggiGame with those moves played from the standard setup.
+    Raises ValueError if a move is rejected.
+    """
+    game = JanggiGame()
+
+    for current_position, new_position in moves:
+        if game.make_move(current_position, new_position) is False:
+            raise ValueError("illegal move " + current_position + "-" + new_position)
+
+    return game
+
+
+class GameRecordWriter:
+    """
+    Writes games to a record file one at a time. Can be used as a context manager, which closes the file on exit.
+    """
+
+    def __init__(self, path, append=False):
+        """
+        Takes a file path and whether to add to an existing file, and opens it for writing. A new or empty file is
+        started with the magic number. Raises ValueError if an existing file is not a record file.
+        """
+        self._file = open(path, 'a+b' if append else 'wb')
+        self._count = 0
+
+        self._file.seek(0, 2)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        else:
+            self._file.seek(0)
+            magic = self._file.read(len(MAGIC))
+            self._file.seek(0, 2)
+            if magic != MAGIC:
+                self._file.close()
+                raise ValueError(str(path) + " is not a game record file")
+
+    def write(self, moves, result):
+        """
+        Takes a list of (from, to) positions and a game state and writes them as one game.
+        """
+        self._file.write(encode_game(moves, result))
+        self._count += 1
+
+    def write_game(self, game):
+        """
+        Takes a game played from the standard setup and writes its moves and state as one game.
+        """
+        moves, result = record_of_game(game)
+        self.write(moves, result)
+
+    def get_count(self):
+        """
+        Returns the number of games written by this writer.
+        """
+        return self._count
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def read_games(path):
+    """
+    Takes the path of a record file and yields a GameRecord for each game in it, reading one game at a time. Raises
+    ValueError if the file is not a record file, ends in the middle of a game or names a square off the board.
+    """
+    names = SQUARE_NAMES
+    header_size = GAME_HEADER.size
+
+    with open(path, 'rb') as record_file:
+        if record_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(str(path) + " is not a game record file")
+
+        while True:
+            header = record_file.read(header_size)
+            if not header:
+                return
+            if len(header) != header_size:
+                raise ValueError(str(path) + " ends in the middle of a game")
+
+            result_code, count = GAME_HEADER.unpack(header)
+            if result_code not in RESULT_NAMES:
+                raise ValueError("unknown result code %d in %s" % (result_code, path))
+
+            data = record_file.read(2 * count)
+            if len(data) != 2 * count:
+                raise ValueError(str(path) + " ends in the middle of a game")
+            if data and max(data) >= len(names):
+                raise ValueError("square %d off the board in %s" % (max(data), path))
+
+            moves = [(names[data[index]], names[data[index + 1]]) for index in range(0, 2 * count, 2)]
+            yield GameRecord(moves, RESULT_NAMES[result_code])
+
+
+def main(argv=None):
+    """
+    Command line entry point. Prints the number of games in a record file and how each ended, optionally replaying
+    every game to check that its moves are legal and reach the stored result.
+    """
+    parser = argparse.ArgumentParser(description="Summarize a Janggi game record file.")
+    parser.add_argument("path", help="game record file")
+    parser.add_argument("--verify", action="store_true", help="replay every game and compare its result")
+    args = parser.parse_args(argv)
+
+    totals = {result: 0 for result in RESULT_CODES}
+    moves_total = 0
+    failures = 0
+
+    for number, (moves, result) in enumerate(read_games(args.path)):
+        totals[result] += 1
+        moves_total += len(moves)
+        if args.verify:
+            try:
+                found = replay(moves).get_game_state()
+            except ValueError as error:
+                found = str(error)
+            if found != result:
+                failures += 1
+                print("game %d: stored %s, replay gives %s" % (number, result, found))
+
+    print("games: %d moves: %d" % (sum(totals.values()), moves_total))
+    for result, count in totals.items():
+        print("%s: %d" % (result, count))
+    if args.verify:
+        print("replay " + ("FAILED" if failures else "passed"))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,513 @@
+#: Description: Alpha-beta search for the Janggi rules engine. Searches a JanggiGame in place with iterative deepening,
+#               using a bounded transposition table and move ordering (hash move, captures by most valuable victim,
+#               killer moves), and stops at a depth, time or node limit. Returns the best move, its score, the
+#               principal variation and the number of nodes searched.
+#               Run from the command line, for example: python JanggiSearch.py --depth 4
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from JanggiGame import PIECE_VALUES, SQUARE_NAMES, JanggiGame
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+
+# transposition table entry bounds
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+SearchResult = namedtuple('SearchResult', ['best_move', 'score', 'principal_variation', 'depth', 'nodes', 'seconds'])
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside the search when the time or node limit is reached.
+    """
+
+
+def evaluate(game, color):
+    """
+    Takes a game and a color and returns the material balance from that player's point of view.
+    """
+    score = 0
+
+    for a_piece in game._red_pieces:
+        if a_piece.get_square() is not None:
+            score += PIECE_VALUES[a_piece.get_name()]
+    for a_piece in game._blue_pieces:
+        if a_piece.get_square() is not None:
+            score -= PIECE_VALUES[a_piece.get_name()]
+
+    return score if color == 'red' else -score
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results keyed by position hash. Each hash maps to one slot. A new entry replaces the
+    slot's entry if it is for the same position, was stored during an earlier search, or was searched no deeper.
+    """
+
+    def __init__(self, size=1 << 18):
+        """
+        Takes the number of slots and initializes an empty table.
+        """
+        self._size = size
+        self._slots = [None] * size
+        self._generation = 0
+
+    def new_search(self):
+        """
+        Takes no parameters and marks all current entries as belonging to an earlier search.
+        """
+        self._generation += 1
+
+    def clear(self):
+        """
+        Takes no parameters and removes every entry.
+        """
+        self._slots = [None] * self._size
+
+    def probe(self, key):
+        """
+        Takes a position hash and returns its (key, depth, score, bound, move, generation) entry, or None.
+        """
+        entry = self._slots[key % self._size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Takes a position hash, the depth searched, the score, its bound type and the best move, and stores them
+        according to the replacement policy.
+        """
+        index = key % self._size
+        entry = self._slots[index]
+
+        if entry is None or entry[0] == key or entry[5] != self._generation or depth >= entry[1]:
+            self._slots[index] = (key, depth, score, bound, move, self._generation)
+
+
+def _score_to_table(score, ply):
+    """
+    Takes a score and the ply it was found at and returns it with mate distances measured from the stored position.
+    """
+    if score > MATE_SCORE - 1000:
+        return score + ply
+    if score < -MATE_SCORE + 1000:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """
+    Takes a stored score and the current ply and returns it with mate distances measured from the root.
+    """
+    if score > MATE_SCORE - 1000:
+        return score - ply
+    if score < -MATE_SCORE + 1000:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """
+    Searches a JanggiGame by making and retracting moves on it. The game is left as it was found.
+    """
+
+    def __init__(self, game, table=None, evaluator=None):
+        """
+        Takes a game, an optional transposition table to share between searches and an optional leaf evaluator
+        taking (game, color), which defaults to the material count in evaluate.
+        """
+        self._game = game
+        self._table = table if table is not None else TranspositionTable()
+        self._evaluate = evaluator if evaluator is not None else evaluate
+        self._nodes = 0
+        self._deadline = None
+        self._node_limit = None
+        self._killers = []
+
+    def search(self, max_depth=64, time_limit=None, node_limit=None):
+        """
+        Takes a maximum depth, an optional time limit in seconds and an optional node limit, and searches with
+        iterative deepening until one of them is reached. Returns a SearchResult for the deepest completed iteration.
+        """
+        game = self._game
+        color = 'red' if game.get_players_turn() == 'red' else 'blue'
+        start = time.perf_counter()
+        history_length = len(game._history)
+
+        self._nodes = 0
+        self._deadline = start + time_limit if time_limit is not None else None
+        self._node_limit = node_limit
+        self._killers = [[None, None] for ply in range(max_depth + 1)]
+        self._table.new_search()
+
+        root_moves = game._legal_moves(color)
+        if not root_moves:
+            return SearchResult(None, 0, [], 0, 0, 0.0)
+
+        best_move, best_score, completed_depth = root_moves[0], 0, 0
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self._search_root(root_moves, depth, color)
+            except SearchAborted:
+                while len(game._history) > history_length:
+                    game._pop()
+                break
+
+            best_move, best_score, completed_depth = move, score, depth
+
+            # search the best move first in the next iteration
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+
+            if abs(score) > MATE_SCORE - 1000:
+                break
+
+        principal_variation = self._principal_variation(best_move, completed_depth)
+        return SearchResult((SQUARE_NAMES[best_move[0]], SQUARE_NAMES[best_move[1]]), best_score,
+                            principal_variation, completed_depth, self._nodes, time.perf_counter() - start)
+
+    def score_position(self, depth, ply, alpha=-INFINITY, beta=INFINITY, time_limit=None):
+        """
+        Takes a depth, the ply of the game's position below the root, an alpha-beta window and an optional time limit
+        in seconds, and returns the score of the position for the player to move, together with its principal
+        variation. Raises SearchAborted if the time limit is reached.
+        """
+        game = self._game
+        color = 'red' if game.get_players_turn() == 'red' else 'blue'
+
+        self._nodes = 0
+        self._deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self._node_limit = None
+        self._killers = [[None, None] for num in range(ply + depth + 1)]
+
+        history_length = len(game._history)
+        try:
+            score = self._negamax(depth, alpha, beta, ply, color)
+        except SearchAborted:
+            while len(game._history) > history_length:
+                game._pop()
+            raise
+
+        entry = self._table.probe(game.position_hash())
+        if entry is None or entry[4] is None:
+            return score, []
+        return score, self._principal_variation(entry[4], depth)
+
+    def _check_limits(self):
+        """
+        Takes no parameters and raises SearchAborted if the time or node limit has been reached.
+        """
+        if self._node_limit is not None and self._nodes >= self._node_limit:
+            raise SearchAborted()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchAborted()
+
+    def _search_root(self, root_moves, depth, color):
+        """
+        Takes the root moves, a depth and the color to move, and returns the best (score, move) at that depth.
+        """
+        game = self._game
+        opposing_color = 'blue' if color == 'red' else 'red'
+        alpha, beta = -INFINITY, INFINITY
+        best_move = root_moves[0]
+
+        for move in root_moves:
+            game._push(*move)
+            score = -self._negamax(depth - 1, -beta, -alpha, 1, opposing_color)
+            game._pop()
+
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        self._table.store(game.position_hash(), depth, _score_to_table(alpha, 0), EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, depth, alpha, beta, ply, color):
+        """
+        Takes the remaining depth, the alpha-beta window, the ply from the root and the color to move, and returns
+        the score of the position from that player's point of view.
+        """
+        self._nodes += 1
+        if self._nodes & 1023 == 0:
+            self._check_limits()
+
+        game = self._game
+        game_state = game.get_game_state()
+        if game_state != 'UNFINISHED':
+            if game_state == 'DRAW':
+                return 0
+            winner = 'blue' if game_state == 'BLUE_WON' else 'red'
+            return MATE_SCORE - ply if winner == color else -MATE_SCORE + ply
+
+        if depth <= 0:
+            return self._quiescence(alpha, beta, ply, color)
+
+        key = game.position_hash()
+        entry = self._table.probe(key)
+        hash_move = None
+
+        if entry is not None:
+            hash_move = entry[4]
+            if entry[1] >= depth:
+                score = _score_from_table(entry[2], ply)
+                if entry[3] == EXACT:
+                    return score
+                if entry[3] == LOWER_BOUND and score >= beta:
+                    return score
+                if entry[3] == UPPER_BOUND and score <= alpha:
+                    return score
+
+        killers = self._killers[ply] if ply < len(self._killers) else ()
+
+        opposing_color = 'blue' if color == 'red' else 'red'
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        board = game._game_board
+
+        # moves are generated and tested lazily, so a cutoff skips the rest
+        for move in game._staged_moves(color, hash_move, killers):
+            is_capture = move[0] != move[1] and board[move[1]] is not None
+
+            game._push(*move)
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1, opposing_color)
+            game._pop()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not is_capture and ply < len(self._killers):
+                    killers = self._killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                break
+
+        if best_move is None:
+            return -MATE_SCORE + ply
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+
+        self._table.store(key, depth, _score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def _quiescence(self, alpha, beta, ply, color):
+        """
+        Takes the alpha-beta window, the ply from the root and the color to move, and searches captures only until
+        the position is quiet, returning its score from that player's point of view.
+        """
+        self._nodes += 1
+        if self._nodes & 1023 == 0:
+            self._check_limits()
+
+        game = self._game
+        game_state = game.get_game_state()
+        if game_state != 'UNFINISHED':
+            if game_state == 'DRAW':
+                return 0
+            winner = 'blue' if game_state == 'BLUE_WON' else 'red'
+            return MATE_SCORE - ply if winner == color else -MATE_SCORE + ply
+
+        stand_pat = self._evaluate(game, color)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        opposing_color = 'blue' if color == 'red' else 'red'
+
+        for move in game._staged_moves(color, captures_only=True):
+            game._push(*move)
+            score = -self._quiescence(-beta, -alpha, ply + 1, opposing_color)
+            game._pop()
+
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        return alpha
+
+    def _principal_variation(self, best_move, depth):
+        """
+        Takes the root best move and the depth searched and returns the expected line of play as position pairs,
+        following best moves stored in the transposition table.
+        """
+        game = self._game
+        variation = []
+        move = best_move
+        seen = set()
+
+        while move is not None and len(variation) < max(depth, 1):
+            color = 'red' if game.get_players_turn() == 'red' else 'blue'
+            if game.get_game_state() != 'UNFINISHED' or move not in game._legal_moves(color):
+                break
+
+            variation.append(move)
+            game._push(*move)
+
+            key = game.position_hash()
+            if key in seen:
+                break
+            seen.add(key)
+
+            entry = self._table.probe(key)
+            move = entry[4] if entry is not None else None
+
+        for num in range(len(variation)):
+            game._pop()
+
+        return [(SQUARE_NAMES[current_square], SQUARE_NAMES[new_square]) for current_square, new_square in variation]
+
+
+def search(game, max_depth=64, time_limit=None, node_limit=None, table=None, evaluator=None):
+    """
+    Takes a game, a maximum depth, optional time and node limits, an optional transposition table and an optional
+    leaf evaluator, and returns a SearchResult with the best move for the player to move.
+    """
+    return Searcher(game, table, evaluator).search(max_depth, time_limit, node_limit)
+
+
+# transposition table kept by each worker process between root-split tasks
+_worker_table = None
+
+
+def _search_root_move(task):
+    """
+    Takes a (compact state, draw state, depth, alpha, deadline) tuple for the position after a root move, where alpha
+    is the score the move must beat or None for a full window and the deadline is a time.time() value or None. Returns
+    (score, principal variation, nodes) from the point of view of the player who made the move, or (None, [], nodes)
+    if the deadline was reached. With an alpha, a score no higher than alpha only means the move is no better.
+    Runs in a worker process.
+    """
+    global _worker_table
+    (state, draw_state), depth, alpha, deadline = task
+
+    if _worker_table is None:
+        _worker_table = TranspositionTable()
+
+    game = JanggiGame.from_compact_state(state)
+    game.set_draw_state(draw_state)
+    searcher = Searcher(game, _worker_table)
+    time_limit = max(deadline - time.time(), 0.0) if deadline is not None else None
+
+    try:
+        if alpha is None:
+            score, variation = searcher.score_position(depth - 1, 1, time_limit=time_limit)
+        else:
+            score, variation = searcher.score_position(depth - 1, 1, -alpha - 1, -alpha, time_limit)
+    except SearchAborted:
+        return None, [], searcher._nodes
+
+    return -score, variation, searcher._nodes
+
+
+def parallel_search(game, max_depth=64, time_limit=None, workers=None):
+    """
+    Takes a game, a maximum depth, an optional time limit in seconds and a number of worker processes, defaulting to
+    one per CPU, and returns a SearchResult like search. Each iteration of the iterative deepening first searches
+    the previous best move, then splits the other root moves across the workers with a null window around its
+    score, re-searching any that beat it. Workers are sent the position after their move as compact_state bytes,
+    with its draw_state so that repetitions and the move limit count the moves played before it.
+    """
+    start = time.perf_counter()
+    deadline = time.time() + time_limit if time_limit is not None else None
+    moves = game.legal_moves()
+
+    if game.get_game_state() != 'UNFINISHED' or not moves:
+        return SearchResult(None, 0, [], 0, 0, 0.0)
+
+    states = []
+    for move in moves:
+        game.push(move)
+        states.append((game.compact_state(), game.draw_state()))
+        game.pop()
+
+    best_move, best_score, best_variation, completed_depth, nodes = moves[0], 0, [], 0, 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        best_index = 0
+
+        for depth in range(1, max_depth + 1):
+            score, variation, searched = executor.submit(
+                _search_root_move, (states[best_index], depth, None, deadline)).result()
+            nodes += searched
+            if score is None:
+                break
+
+            others = [index for index in range(len(moves)) if index != best_index]
+            results = list(executor.map(_search_root_move, [(states[index], depth, score, deadline)
+                                                            for index in others]))
+            nodes += sum(result[2] for result in results)
+            if any(result[0] is None for result in results):
+                break
+
+            # moves that beat the first move's score are searched again with a full window
+            better = [index for index, result in zip(others, results) if result[0] > score]
+            results = list(executor.map(_search_root_move, [(states[index], depth, None, deadline)
+                                                            for index in better]))
+            nodes += sum(result[2] for result in results)
+            if any(result[0] is None for result in results):
+                break
+
+            for index, result in zip(better, results):
+                if result[0] > score:
+                    best_index, score, variation = index, result[0], result[1]
+
+            best_move, best_score, completed_depth = moves[best_index], score, depth
+            best_variation = [best_move] + variation
+
+            if abs(best_score) > MATE_SCORE - 1000:
+                break
+
+    return SearchResult(best_move, best_score, best_variation, completed_depth, nodes, time.perf_counter() - start)
+
+
+def main(argv=None):
+    """
+    Command line entry point. Searches the standard setup, optionally after some moves, and prints the result.
+    """
+    parser = argparse.ArgumentParser(description="Search a Janggi position for the best move.")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth to search")
+    parser.add_argument("--time", type=float, default=None, help="time limit in seconds")
+    parser.add_argument("--nodes", type=int, default=None, help="node limit")
+    parser.add_argument("--moves", default="", help="moves to play from the standard setup, e.g. c7-c6,c4-c5")
+    parser.add_argument("--workers", type=int, default=None, help="split root moves across this many processes")
+    args = parser.parse_args(argv)
+
+    game = JanggiGame()
+    for move in args.moves.split(',') if args.moves else []:
+        if game.push(tuple(move.split('-'))) is False:
+            print("illegal move " + move)
+            return 1
+
+    if args.workers is not None:
+        result = parallel_search(game, args.depth, args.time, args.workers)
+    else:
+        result = search(game, args.depth, args.time, args.nodes)
+    print("best move: %s-%s" % result.best_move if result.best_move else "best move: none")
+    print("score: %d" % result.score)
+    print("pv: " + " ".join("%s-%s" % move for move in result.principal_variation))
+    print("depth: %d nodes: %d seconds: %.3f nodes/sec: %.0f" % (
+        result.depth, result.nodes, result.seconds, result.nodes / result.seconds if result.seconds else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
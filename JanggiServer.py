@@ -0,0 +1,314 @@
+#: Description: Asyncio game service for the Janggi rules engine. Hosts many JanggiGame sessions in memory and serves
+#               them over a local TCP or Unix socket with a line-delimited JSON protocol. Each request is one JSON
+#               object on one line with an "op" and, for most ops, a "game" id; each reply is one JSON object with
+#               "ok" true or false and the request's "id" echoed back. Checkmate tests run in a thread and searches in
+#               worker processes so the event loop never waits on them. Malformed requests get an error reply rather
+#               than dropping the connection, and searches are capped in depth and time. Includes a load generator.
+#               Run from the command line, for example: python JanggiServer.py serve --port 8765
+#                                                       python JanggiServer.py load --port 8765 --clients 100
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from JanggiGame import COLORS, JanggiGame
+from JanggiSearch import search
+
+# limits on one search request, so that a client cannot hold a search worker indefinitely
+MAX_SEARCH_DEPTH = 8
+MAX_SEARCH_SECONDS = 10.0
+
+
+class Session:
+    """
+    One hosted game. The lock keeps requests for the same game from interleaving while one of them waits on an
+    executor.
+    """
+
+    __slots__ = ('game', 'lock')
+
+    def __init__(self, game):
+        """
+        Takes a game and initializes the session.
+        """
+        self.game = game
+        self.lock = asyncio.Lock()
+
+
+def _search_task(state, draw_state, depth, time_limit):
+    """
+    Takes a position as a compact state and draw state, a depth and a time limit and returns (best move, score) for
+    the player to move. Runs in a worker process.
+    """
+    game = JanggiGame.from_compact_state(state)
+    game.set_draw_state(draw_state)
+    result = search(game, depth, time_limit)
+    return result.best_move, result.score
+
+
+class GameServer:
+    """
+    Holds the sessions and answers requests. Ops:
+    new (optional fen), move (from, to), state, check (color), checkmate (color), legal_moves, fen,
+    search (optional depth up to MAX_SEARCH_DEPTH and time in seconds up to MAX_SEARCH_SECONDS) and close.
+    """
+
+    def __init__(self, search_workers=None):
+        """
+        Takes the number of search worker processes, defaulting to one per CPU, and initializes an empty store.
+        """
+        self._sessions = {}
+        self._game_ids = itertools.count(1)
+        self._search_workers = search_workers
+        self._search_executor = None
+        self._requests = 0
+
+    def get_session_count(self):
+        """
+        Returns the number of hosted games.
+        """
+        return len(self._sessions)
+
+    async def handle_request(self, request):
+        """
+        Takes a decoded request and returns the reply dict. Fields of the wrong type or out of range get an error
+        reply.
+        """
+        self._requests += 1
+        op = request.get("op")
+
+        if op == "new":
+            fen = request.get("fen")
+            if fen:
+                if not isinstance(fen, str):
+                    return {"ok": False, "error": "fen must be a string"}
+                try:
+                    game = JanggiGame.from_fen(fen)
+                except ValueError as error:
+                    return {"ok": False, "error": str(error)}
+            else:
+                game = JanggiGame()
+            game_id = str(next(self._game_ids))
+            self._sessions[game_id] = Session(game)
+            return {"ok": True, "game": game_id}
+
+        session = self._sessions.get(str(request.get("game")))
+        if session is None:
+            return {"ok": False, "error": "unknown game"}
+
+        game = session.game
+
+        async with session.lock:
+            if op == "move":
+                current_position, new_position = request.get("from"), request.get("to")
+                if not isinstance(current_position, str) or not isinstance(new_position, str):
+                    return {"ok": False, "error": "from and to must be strings"}
+                moved = game.make_move(current_position, new_position)
+                return {"ok": True, "moved": moved, "state": game.get_game_state(), "turn": game.get_players_turn(),
+                        "check": game._is_in_check or None}
+
+            if op == "state":
+                return {"ok": True, "state": game.get_game_state(), "turn": game.get_players_turn()}
+
+            if op in ("check", "checkmate") and request.get("color") not in COLORS:
+                return {"ok": False, "error": "color must be 'red' or 'blue'"}
+
+            if op == "check":
+                return {"ok": True, "check": game.is_in_check(request.get("color"))}
+
+            if op == "checkmate":
+                loop = asyncio.get_running_loop()
+                checkmate = await loop.run_in_executor(None, game.is_checkmate, request.get("color"))
+                return {"ok": True, "checkmate": checkmate}
+
+            if op == "legal_moves":
+                return {"ok": True, "moves": game.legal_moves()}
+
+            if op == "fen":
+                return {"ok": True, "fen": game.to_fen()}
+
+            if op == "search":
+                depth = request.get("depth", 3)
+                time_limit = request.get("time", MAX_SEARCH_SECONDS)
+                if not isinstance(depth, int) or isinstance(depth, bool) or not 1 <= depth <= MAX_SEARCH_DEPTH:
+                    return {"ok": False, "error": "depth must be a whole number from 1 to %d" % MAX_SEARCH_DEPTH}
+                if (not isinstance(time_limit, (int, float)) or isinstance(time_limit, bool)
+                        or not 0 < time_limit <= MAX_SEARCH_SECONDS):
+                    return {"ok": False, "error": "time must be a number of seconds up to %g" % MAX_SEARCH_SECONDS}
+
+                if self._search_executor is None:
+                    self._search_executor = ProcessPoolExecutor(max_workers=self._search_workers)
+                loop = asyncio.get_running_loop()
+                best_move, score = await loop.run_in_executor(
+                    self._search_executor, _search_task, game.compact_state(), game.draw_state(), depth,
+                    time_limit)
+                return {"ok": True, "move": best_move, "score": score}
+
+            if op == "close":
+                del self._sessions[str(request.get("game"))]
+                return {"ok": True}
+
+        return {"ok": False, "error": "unknown op"}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Takes the streams of a client connection and answers its requests in order until it disconnects.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be an object")
+                except ValueError as error:
+                    reply = {"ok": False, "error": "bad request: " + str(error)}
+                else:
+                    # a request that fails still gets a reply, so the client is not left waiting
+                    try:
+                        reply = await self.handle_request(request)
+                    except Exception as error:
+                        reply = {"ok": False, "error": "request failed: " + str(error)}
+                    if "id" in request:
+                        reply["id"] = request["id"]
+
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        """
+        Shuts down the search workers.
+        """
+        if self._search_executor is not None:
+            self._search_executor.shutdown()
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None, search_workers=None):
+    """
+    Takes a host and port, or a Unix socket path, and the number of search workers, and serves games until
+    cancelled.
+    """
+    server = GameServer(search_workers)
+
+    if unix_path is not None:
+        listener = await asyncio.start_unix_server(server.handle_connection, unix_path, limit=1 << 20)
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host, port, limit=1 << 20)
+
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+async def _load_client(open_connection, games, max_moves, latencies):
+    """
+    Takes a function opening a connection, a number of games, a maximum number of moves per game and a list to
+    append request latencies to, and plays that many random games one after another. Returns the moves made.
+    """
+    reader, writer = await open_connection()
+    moves_made = 0
+
+    async def call(request):
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        return reply
+
+    for num in range(games):
+        game_id = (await call({"op": "new"}))["game"]
+
+        for ply in range(max_moves):
+            moves = (await call({"op": "legal_moves", "game": game_id}))["moves"]
+            if not moves:
+                break
+            current_position, new_position = random.choice(moves)
+            reply = await call({"op": "move", "game": game_id, "from": current_position, "to": new_position})
+            moves_made += 1
+            if reply["state"] != "UNFINISHED":
+                break
+
+        await call({"op": "close", "game": game_id})
+
+    writer.close()
+    return moves_made
+
+
+async def run_load(host="127.0.0.1", port=8765, unix_path=None, clients=100, games=1, max_moves=40):
+    """
+    Takes the server address, the number of concurrent client connections, the games each plays and the maximum
+    moves per game, and returns (moves, requests, seconds, p50 latency, p99 latency).
+    """
+    if unix_path is not None:
+        def open_connection():
+            return asyncio.open_unix_connection(unix_path, limit=1 << 20)
+    else:
+        def open_connection():
+            return asyncio.open_connection(host, port, limit=1 << 20)
+
+    latencies = []
+    start = time.perf_counter()
+    moves = await asyncio.gather(*[_load_client(open_connection, games, max_moves, latencies)
+                                   for num in range(clients)])
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    if not latencies:
+        return sum(moves), 0, seconds, 0.0, 0.0
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return sum(moves), len(latencies), seconds, p50, p99
+
+
+def main(argv=None):
+    """
+    Command line entry point. Runs the server, or the load generator against a running server.
+    """
+    parser = argparse.ArgumentParser(description="Serve Janggi games over a line-delimited JSON socket.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("serve", "run the game server"), ("load", "generate load against a running server")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--host", default="127.0.0.1", help="TCP host")
+        command.add_argument("--port", type=int, default=8765, help="TCP port")
+        command.add_argument("--unix", default=None, help="Unix socket path to use instead of TCP")
+        if name == "serve":
+            command.add_argument("--search-workers", type=int, default=None, help="search worker processes")
+        else:
+            command.add_argument("--clients", type=int, default=100, help="concurrent client connections")
+            command.add_argument("--games", type=int, default=1, help="games played by each client")
+            command.add_argument("--max-moves", type=int, default=40, help="maximum moves per game")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix, args.search_workers))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    moves, requests, seconds, p50, p99 = asyncio.run(
+        run_load(args.host, args.port, args.unix, args.clients, args.games, args.max_moves))
+    print("moves: %d requests: %d seconds: %.3f moves/sec: %.0f requests/sec: %.0f" % (
+        moves, requests, seconds, moves / seconds if seconds else 0, requests / seconds if seconds else 0))
+    print("latency p50: %.2f ms p99: %.2f ms" % (p50 * 1000, p99 * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
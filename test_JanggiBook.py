@@ -0,0 +1,99 @@
+#: Description: Tests for JanggiBook: a book built from a game record file holds exactly the counted opening moves
+#               and is probed back through OpeningBook and JanggiGame.book_moves. Run with: python -m pytest
+
+import pytest
+
+from JanggiBook import MAGIC, OpeningBook, build_book
+from JanggiGame import SQUARE_INDEX, JanggiGame
+from JanggiRecord import GameRecordWriter, record_of_game
+from test_JanggiGame import random_games
+
+
+def write_records(path, games):
+    """
+    Takes a record file path and games, writes the games to the file and returns their GameRecords.
+    """
+    records = [record_of_game(game) for game in games]
+    with GameRecordWriter(path) as writer:
+        for moves, result in records:
+            writer.write(moves, result)
+    return records
+
+
+def count_moves(records, max_plies):
+    """
+    Takes GameRecords and a number of opening plies and returns a dict of (position hash, from square, to square) to
+    the number of games playing that move, leaving out passes.
+    """
+    counts = {}
+
+    for moves, result in records:
+        game = JanggiGame()
+        for current_position, new_position in moves[:max_plies]:
+            key = game.position_hash()
+            game.make_move(current_position, new_position)
+            if current_position != new_position:
+                entry = (key, SQUARE_INDEX[current_position], SQUARE_INDEX[new_position])
+                counts[entry] = counts.get(entry, 0) + 1
+
+    return counts
+
+
+def test_book_round_trip(tmp_path):
+    records = write_records(tmp_path / "games.jgr", random_games(60, seed=4, max_moves=12))
+    expected = count_moves(records, 8)
+
+    assert build_book([tmp_path / "games.jgr"], tmp_path / "book.jgb", max_plies=8) == len(expected)
+
+    with OpeningBook(tmp_path / "book.jgb") as book:
+        assert len(book) == len(expected)
+
+        found = {}
+        for key in {entry[0] for entry in expected}:
+            for current_square, new_square, weight in book.probe(key):
+                found[(key, current_square, new_square)] = weight
+        assert found == expected
+
+        assert book.probe(0) == []
+
+
+def test_book_moves(tmp_path):
+    records = write_records(tmp_path / "games.jgr", random_games(60, seed=5, max_moves=6))
+    build_book([str(tmp_path / "games.jgr")], tmp_path / "book.jgb", max_plies=1)
+
+    first_moves = {}
+    for moves, result in records:
+        if moves and moves[0][0] != moves[0][1]:
+            first_moves[moves[0]] = first_moves.get(moves[0], 0) + 1
+
+    with OpeningBook(tmp_path / "book.jgb") as book:
+        book_moves = JanggiGame().book_moves(book)
+
+    assert dict(book_moves) == first_moves
+    weights = [weight for move, weight in book_moves]
+    assert weights == sorted(weights, reverse=True)
+
+
+def test_min_count(tmp_path):
+    records = write_records(tmp_path / "games.jgr", random_games(60, seed=6, max_moves=4))
+    expected = {entry: count for entry, count in count_moves(records, 4).items() if count >= 2}
+
+    assert build_book([str(tmp_path / "games.jgr")], tmp_path / "book.jgb", max_plies=4, min_count=2) == len(expected)
+
+
+def test_illegal_move(tmp_path):
+    path = tmp_path / "games.jgr"
+    with GameRecordWriter(path) as writer:
+        writer.write([('c7', 'c5')], 'UNFINISHED')
+
+    with pytest.raises(ValueError, match="illegal move c7-c5"):
+        build_book([path], tmp_path / "book.jgb")
+
+
+@pytest.mark.parametrize("data", [b'', b'JGB0', MAGIC + b'\x00' * 5])
+def test_bad_files(tmp_path, data):
+    path = tmp_path / "bad.jgb"
+    path.write_bytes(data)
+
+    with pytest.raises(ValueError):
+        OpeningBook(path)
@@ -0,0 +1,265 @@
+#: Description: Tests for JanggiGame's position formats, checkmate and draw rules: FEN-style text and Position
+#               snapshots round-trip the positions of random games, checks are escaped by capturing or blocking
+#               the checker, and repetition, bikjang and the move limit draw the game. Run with: python -m pytest
+
+import random
+
+import pytest
+
+from JanggiGame import START_FEN, JanggiGame, Position
+
+# a position in which blue is checkmated
+CHECKMATE_FEN = "2Rk1abn1/9/1c1P5/p1p4p1/9/8p/P2P1P3/RC4N2/3K5/1B1A1AB2 b 0 25"
+
+# blue's general on e10 is held in by its own elephants and checked down the e file by red's chariot on e2
+CHARIOT_MATE_FEN = "3bkb3/9/9/9/9/9/9/9/3KR4/9 b"
+
+# positions in which blue is in check, with the only moves that get out of it
+CHECK_ESCAPES = [
+    # blocking the chariot's line
+    ("3bkb3/9/9/9/r8/9/9/9/3KR4/9 b", [('a6', 'e6')]),
+    # capturing the chariot
+    ("3bkb3/9/9/9/9/9/9/9/r3RK3/9 b", [('a2', 'e2')]),
+    # moving the soldier that screens red's cannon out of the line
+    ("3bkb3/9/9/9/9/4p4/9/9/3KC4/9 b", [('e5', 'd5'), ('e5', 'f5')]),
+    # or blocking the cannon's jump with a second piece
+    ("3bkb3/9/9/r8/9/4p4/9/9/3KC4/9 b", [('a7', 'e7'), ('e5', 'd5'), ('e5', 'f5')]),
+]
+
+# generals on different files, where blue can bring them face to face with d10-e10
+GENERALS_FEN = "3k5/9/9/9/9/9/9/9/4K4/9 b"
+
+# a position in which blue's chariot can capture red's with a10-a3
+CAPTURE_FEN = "r2k5/9/9/9/9/9/9/R8/4K4/9 b"
+
+
+def random_games(count=40, seed=1, max_moves=80):
+    """
+    Takes a number of games, a random seed and a maximum game length, and returns games reached by playing random
+    legal moves from the standard setup.
+    """
+    generator = random.Random(seed)
+    games = []
+
+    for num in range(count):
+        game = JanggiGame()
+        for ply in range(generator.randint(0, max_moves)):
+            if game.get_game_state() != 'UNFINISHED':
+                break
+            game.push(generator.choice(game.legal_moves()))
+        games.append(game)
+
+    return games
+
+
+def test_start_fen():
+    assert JanggiGame().to_fen() == START_FEN
+    game = JanggiGame.from_fen(START_FEN)
+    assert game.position_hash() == JanggiGame().position_hash()
+    assert game.get_players_turn() == 'blue'
+
+
+def test_fen_round_trip():
+    for game in random_games():
+        fen = game.to_fen()
+        loaded = JanggiGame.from_fen(fen)
+
+        assert loaded.to_fen() == fen
+        assert loaded.position_hash() == game.position_hash()
+
+        # a draw depends on the moves that led to it, which FEN does not record
+        if game.get_game_state() != 'DRAW':
+            assert loaded.get_game_state() == game.get_game_state()
+            assert sorted(loaded.legal_moves()) == sorted(game.legal_moves())
+
+
+def test_fen_without_counters():
+    game = random_games(1, seed=2)[0]
+    ranks, side = game.to_fen().split()[:2]
+    assert JanggiGame.from_fen(ranks + " " + side).position_hash() == game.position_hash()
+
+
+def test_fen_checkmate():
+    game = JanggiGame.from_fen(CHECKMATE_FEN)
+    assert game.get_game_state() == 'RED_WON'
+    assert game.to_fen() == CHECKMATE_FEN
+
+
+@pytest.mark.parametrize("fen, escapes", CHECK_ESCAPES)
+def test_check_escapes(fen, escapes):
+    game = JanggiGame.from_fen(fen)
+    assert game.is_in_check('blue')
+    assert not game.is_checkmate('blue')
+    assert game.get_game_state() == 'UNFINISHED'
+    assert sorted(game.legal_moves()) == escapes
+
+    for move in escapes:
+        game.push(move)
+        assert not game.is_in_check('blue')
+        game.pop()
+
+
+@pytest.mark.parametrize("fen", [CHECKMATE_FEN, CHARIOT_MATE_FEN])
+def test_checkmate(fen):
+    game = JanggiGame.from_fen(fen)
+    assert game.is_in_check('blue')
+    assert game.is_checkmate('blue')
+    assert not game.is_checkmate('red')
+    assert game.legal_moves() == []
+    assert game.get_game_state() == 'RED_WON'
+
+
+@pytest.mark.parametrize("fen", [
+    "",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/RBNA1ABNR",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/RBNA1ABNR x",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4 b",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/RBNA1ABNRR b",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/RBNA1ABNX b",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RBNA1ABNR b",
+    "rbna1abnr/4k4/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/4K4/RBNA1ABNR b x 1",
+    # blue is in check with red to move, who could capture the general
+    "9/4k4/9/9/9/4R4/9/9/4K4/9 r",
+])
+def test_bad_fen(fen):
+    with pytest.raises(ValueError):
+        JanggiGame.from_fen(fen)
+
+
+def test_snapshot_round_trip():
+    for game in random_games(seed=7):
+        position = game.snapshot()
+        loaded = JanggiGame.from_position(position)
+
+        assert loaded.snapshot() == position
+        assert loaded.position_hash() == position.position_hash
+        assert hash(loaded.snapshot()) == hash(position)
+        assert loaded.to_fen().split()[:2] == game.to_fen().split()[:2]
+
+        if game.get_game_state() != 'DRAW':
+            assert loaded.get_game_state() == game.get_game_state()
+            assert sorted(loaded.legal_moves()) == sorted(game.legal_moves())
+
+
+def test_snapshot_checkmate():
+    position = JanggiGame.from_fen(CHECKMATE_FEN).snapshot()
+    assert position.players_turn == 'blue'
+    assert JanggiGame.from_position(position).get_game_state() == 'RED_WON'
+
+
+def test_snapshot_is_a_key():
+    # the same position reached by two move orders
+    game = JanggiGame()
+    for move in (('c7', 'c6'), ('c4', 'c5'), ('g7', 'g6'), ('g4', 'g5')):
+        game.push(move)
+    other = JanggiGame()
+    for move in (('g7', 'g6'), ('g4', 'g5'), ('c7', 'c6'), ('c4', 'c5')):
+        other.push(move)
+
+    table = {game.snapshot(): 'seen'}
+    assert other.snapshot() == game.snapshot()
+    assert table[other.snapshot()] == 'seen'
+    assert JanggiGame().snapshot() not in table
+
+
+def test_snapshot_is_immutable():
+    game = JanggiGame()
+    position = game.snapshot()
+    game.push(('c7', 'c6'))
+
+    assert isinstance(position, Position)
+    assert position == JanggiGame().snapshot()
+    assert position.piece_at('c7') == ('Soldier', 'blue')
+    assert position.piece_at('c6') is None
+    with pytest.raises(AttributeError):
+        position.players_turn = 'red'
+    with pytest.raises(TypeError):
+        position.cells[0] = 0
+
+
+def pass_turns(game, plies):
+    """
+    Takes a game and a number of plies and passes that many turns, returning the game.
+    """
+    for ply in range(plies):
+        # a move from a square to itself passes
+        assert game.push(('e5', 'e5'))
+    return game
+
+
+def test_repetition_draw():
+    game = pass_turns(JanggiGame(), 3)
+    assert game.get_game_state() == 'UNFINISHED'
+
+    # the starting position with blue to move is reached for the third time
+    pass_turns(game, 1)
+    assert game.get_game_state() == 'DRAW'
+    assert not game.push(('c7', 'c6'))
+
+    game = JanggiGame()
+    game.set_draw_rules(False)
+    assert pass_turns(game, 8).get_game_state() == 'UNFINISHED'
+
+
+@pytest.mark.parametrize("reply, state", [
+    (('e2', 'e2'), 'DRAW'),
+    (('e2', 'e1'), 'DRAW'),
+    (('e2', 'd2'), 'UNFINISHED'),
+])
+def test_bikjang(reply, state):
+    game = JanggiGame.from_fen(GENERALS_FEN)
+
+    # bringing the generals face to face does not end the game, but leaving them facing does
+    assert game.push(('d10', 'e10'))
+    assert game.get_game_state() == 'UNFINISHED'
+    assert game.push(reply)
+    assert game.get_game_state() == state
+
+
+def test_max_plies():
+    game = JanggiGame()
+    game.set_draw_rules(True, 6)
+    for move in (('c7', 'c6'), ('c4', 'c5'), ('a10', 'a9'), ('a1', 'a2'), ('a9', 'a10')):
+        assert game.push(move)
+    assert game.get_game_state() == 'UNFINISHED'
+
+    assert game.push(('a2', 'a1'))
+    assert game.get_game_state() == 'DRAW'
+
+    game.pop()
+    assert game.get_game_state() == 'UNFINISHED'
+    game.set_draw_rules(True, None)
+    assert game.push(('a2', 'a1'))
+    assert game.get_game_state() == 'UNFINISHED'
+
+
+def test_pop_capture_restores_counts():
+    game = pass_turns(JanggiGame.from_fen(CAPTURE_FEN), 2)
+    state = game.draw_state()
+
+    # a capture resets the counts, and retracting it brings them back
+    assert game.push(('a10', 'a3'))
+    assert game.draw_state()[2] != state[2]
+    assert game.pop() == ('a10', 'a3')
+    assert game.draw_state() == state
+
+    assert pass_turns(game, 2).get_game_state() == 'DRAW'
+
+
+def test_draw_state_carried_over():
+    game = JanggiGame()
+    game.set_draw_rules(True, 30)
+    for move in (('c7', 'c6'), ('c4', 'c5')):
+        game.push(move)
+    pass_turns(game, 2)
+
+    loaded = JanggiGame.from_compact_state(game.compact_state())
+    loaded.set_draw_state(game.draw_state())
+    assert loaded.draw_state() == game.draw_state()
+
+    # two more passes repeat the position a third time
+    for other in (game, loaded):
+        assert pass_turns(other, 2).get_game_state() == 'DRAW'
+
+    fresh = JanggiGame.from_compact_state(game.compact_state())
+    assert pass_turns(fresh, 2).get_game_state() == 'UNFINISHED'
@@ -0,0 +1,16 @@
+#: Description: Tests for JanggiPerft: move generation matches the stored reference counts, and divide splits the same
+#               count across the root moves. Run with: python -m pytest
+
+from JanggiPerft import REFERENCE_POSITIONS, check_reference, divide, game_from_moves, perft
+
+
+def test_reference_counts():
+    assert check_reference(3) == []
+
+
+def test_divide():
+    game = game_from_moves(REFERENCE_POSITIONS['opening'])
+    counts = divide(game, 2)
+
+    assert sorted(counts) == sorted(game.legal_moves())
+    assert sum(counts.values()) == perft(game, 2)
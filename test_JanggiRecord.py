@@ -0,0 +1,61 @@
+#: Description: Tests for JanggiRecord: random games round-trip through record files and replay to the stored
+#               result, and malformed files are rejected. Run with: python -m pytest
+
+import pytest
+
+from JanggiRecord import (MAGIC, GameRecord, GameRecordWriter, encode_game, read_games, record_of_game,
+                          replay)
+from test_JanggiGame import random_games
+
+
+def test_record_round_trip(tmp_path):
+    path = tmp_path / "games.jgr"
+    games = random_games(seed=3, max_moves=120)
+
+    with GameRecordWriter(path) as writer:
+        for game in games:
+            writer.write_game(game)
+        assert writer.get_count() == len(games)
+
+    records = list(read_games(path))
+    assert records == [record_of_game(game) for game in games]
+
+    for record, game in zip(records, games):
+        replayed = replay(record.moves)
+        assert replayed.get_game_state() == record.result
+        assert replayed.position_hash() == game.position_hash()
+
+
+def test_append(tmp_path):
+    path = tmp_path / "games.jgr"
+    first = GameRecord([('c7', 'c6'), ('e2', 'e2')], 'UNFINISHED')
+    second = GameRecord([], 'DRAW')
+
+    with GameRecordWriter(path) as writer:
+        writer.write(*first)
+    with GameRecordWriter(path, append=True) as writer:
+        writer.write(*second)
+
+    assert list(read_games(path)) == [first, second]
+
+
+def test_encode_errors():
+    with pytest.raises(ValueError):
+        encode_game([('c7', 'c6')], 'NOBODY_WON')
+    with pytest.raises(ValueError):
+        encode_game([('c7', 'c11')], 'UNFINISHED')
+
+
+@pytest.mark.parametrize("data", [
+    b'JGR0',
+    MAGIC + b'\x00\x01',
+    MAGIC + b'\x00\x02\x00\x00\x01',
+    MAGIC + b'\x09\x00\x00',
+    MAGIC + b'\x00\x01\x00\x00\x5a',
+])
+def test_bad_files(tmp_path, data):
+    path = tmp_path / "bad.jgr"
+    path.write_bytes(data)
+
+    with pytest.raises(ValueError):
+        list(read_games(path))